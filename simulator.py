@@ -1,10 +1,12 @@
-import random
 import streamlit as st
 from collections import deque
+from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List, Optional, Tuple
+from itertools import islice
+from bisect import bisect_right
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
 import time
-import datetime
 import pandas as pd
 import numpy as np
 from io import BytesIO
@@ -39,32 +41,78 @@ BUFFER_CONFIG: Dict[str, Dict[str, object]] = {
 # Updated buffer allocations
 O1_BUFFERS = ["L1", "L2", "L3", "L4"]  # Now includes L4
 O2_BUFFERS = ["L5", "L6", "L7", "L8", "L9"]  # Now only L5-L9
+LINE_IDS: Tuple[str, ...] = tuple(BUFFER_CONFIG.keys())
+LINE_INDEX: Dict[str, int] = {line_id: i for i, line_id in enumerate(LINE_IDS)}
+SORTED_LINE_IDS: Tuple[str, ...] = tuple(sorted(LINE_IDS))  # Display order, fixed by the config
 ALL_COLORS = list(COLOR_DISTRIBUTION.keys())
 
+# The simulation works on integer color indices; names are only used for display
+COLOR_NAMES: Tuple[str, ...] = tuple(ALL_COLORS)
+
+# Cumulative color probabilities for vectorized sampling; the last bound is snapped to
+# exactly 1.0 so any draw in [0, 1) lands on a valid index without clamping
+_CUM = np.cumsum(np.fromiter(COLOR_DISTRIBUTION.values(), dtype=np.float64))
+_CUM[-1] = 1.0
+_COLORS = np.arange(len(ALL_COLORS), dtype=np.int16)
+
 # Color mapping for UI
 COLOR_MAP = {
     "C1": "#432323", "C2": "#D97D55", "C3": "#696FC7", "C4": "#F2AEBB",
     "C5": "#134686", "C6": "#feb21a", "C7": "#3a6f43", "C8": "#08cb00",
     "C9": "#f5d2d2", "C10": "#bde3c3", "C11": "#00caff", "C12": "#00ffde"
 }
+COLOR_MAP_BY_IDX = [COLOR_MAP.get(color, "#888888") for color in ALL_COLORS]
 
 # Time configuration
 PROCESSING_TIME_PER_VEHICLE = 1  # 1 second base processing time per vehicle
 PENALTY_TIME_O1_L5_L9 = 1  # 1 second penalty when O1 uses L5-L9
 PENALTY_TIME_COLOR_CHANGE = 1  # 1 second penalty for color change on conveyor
 
+RECENT_ACTIVITY_LEN = 200  # Cycles kept in the recent activity log
+PENALTY_LOG_LEN = 50  # Penalty events kept for the sidebar log
+CONVEYOR_SEQUENCE_LEN = 50  # Extractions kept for the conveyor panel and report
+
 # ------------------------------
 # HELPERS
 # ------------------------------
 
-def generate_vehicle_color() -> str:
-    r = random.random()
-    cum = 0.0
-    for color, p in COLOR_DISTRIBUTION.items():
-        cum += p
-        if r <= cum:
-            return color
-    return "C1"
+def generate_vehicle_colors(n: int) -> np.ndarray:
+    """Draw n color indices at once with a single searchsorted over the cumulative distribution"""
+    return _COLORS[np.searchsorted(_CUM, np.random.random(n), side='right')]
+
+
+class ColorPool:
+    """Color indices pre-drawn in one vectorized batch and handed out a few per cycle"""
+
+    def __init__(self, batch_size: int = 4096):
+        self.batch_size = batch_size
+        self._colors: List[int] = []
+        self._pos = 0
+
+    def draw(self, n: int) -> List[int]:
+        if self._pos + n > len(self._colors):
+            self._colors = generate_vehicle_colors(max(n, self.batch_size)).tolist()
+            self._pos = 0
+        start = self._pos
+        self._pos += n
+        return self._colors[start:self._pos]
+
+
+_last_stamp: Tuple[int, str] = (-1, "")
+
+
+def clock_stamp() -> str:
+    """Current wall-clock time as HH:MM:SS, formatted at most once per second"""
+    global _last_stamp
+    now = int(time.time())
+    if now != _last_stamp[0]:
+        _last_stamp = (now, time.strftime("%H:%M:%S", time.localtime(now)))
+    return _last_stamp[1]
+
+
+def first_n(items, n: int) -> list:
+    """First n items of any iterable (deques do not slice)"""
+    return list(islice(items, n))
 
 
 class OvenType(Enum):
@@ -72,114 +120,401 @@ class OvenType(Enum):
     O2 = "O2"
 
 
+OVEN_TYPES = tuple(OvenType)
+# Keyed by value: Streamlit reruns redefine OvenType, so members aren't stable dict keys
+OVEN_INDEX: Dict[str, int] = {oven.value: i for i, oven in enumerate(OVEN_TYPES)}
+
+
 class VehicleBody:
-    def __init__(self, body_id: int, color: str, source_oven: OvenType):
+    __slots__ = ('body_id', 'color', 'source_oven')
+
+    def __init__(self, body_id: int, color: int, source_oven: OvenType):
         self.body_id = body_id
         self.color = color
         self.source_oven = source_oven
 
+    @property
+    def color_name(self) -> str:
+        return COLOR_NAMES[self.color]
+
     def __repr__(self):
-        return f"Body({self.body_id}, {self.color}, {self.source_oven.value})"
+        return f"Body({self.body_id}, {self.color_name}, {self.source_oven.value})"
+
+
+@dataclass(slots=True)
+class PlacementRecord:
+    """One recent-activity entry; absent sections keep None colors"""
+    cycle: int
+    kind: str
+    o1_color: Optional[int] = None
+    o1_buffer: Optional[str] = None
+    o1_penalty: bool = False
+    o2_color: Optional[int] = None
+    o2_buffer: Optional[str] = None
+    tmp_color: Optional[int] = None
+    tmp_buffer: Optional[str] = None
+    tmp_id: Optional[int] = None
+    conv_color: Optional[int] = None
+    conv_buffer: Optional[str] = None
+    conv_id: Optional[int] = None
+    conv_color_change: bool = False
+    # Rendered by activity_entry the first time the entry is displayed or reported
+    pdf_html: str = ""
+    ui_html: str = ""
 
 
 class BufferLine:
+    """Fixed-capacity FIFO stored as a ring of parallel color/id/oven arrays"""
+
     def __init__(self, line_id: str, capacity: int):
         self.line_id = line_id
         self.capacity = capacity
-        self.queue = deque()
+        self.colors = np.empty(capacity, dtype=np.int16)
+        self.ids = np.empty(capacity, dtype=np.int32)
+        self.ovens = np.empty(capacity, dtype=np.int8)
+        self.head = 0
+        self.size = 0
         self.is_available_input = True
         self.is_available_output = True
+        # Color summaries kept up to date by add_body/remove_body
+        self._front_color: Optional[int] = None
+        self._rear_color: Optional[int] = None
+        self._rear_run = 0
+        self._head_run = 0
 
     def is_full(self) -> bool:
-        return len(self.queue) >= self.capacity
+        return self.size >= self.capacity
 
     def is_empty(self) -> bool:
-        return len(self.queue) == 0
+        return self.size == 0
 
     def add_body(self, body: VehicleBody) -> bool:
-        if not self.is_available_input or len(self.queue) >= self.capacity:
+        if not self.is_available_input or self.size >= self.capacity:
             return False
-        self.queue.append(body)
+        color = body.color
+        tail = (self.head + self.size) % self.capacity
+        self.colors[tail] = color
+        self.ids[tail] = body.body_id
+        self.ovens[tail] = OVEN_INDEX[body.source_oven.value]
+        if self.size == 0:
+            self._front_color = color
+            self._rear_run = 1
+            self._head_run = 1
+        elif color == self._rear_color:
+            self._rear_run += 1
+            # The head run only grows while the whole line is one color
+            if self._head_run == self.size:
+                self._head_run += 1
+        else:
+            self._rear_run = 1
+        self._rear_color = color
+        self.size += 1
         return True
 
+    def _body_at(self, slot: int) -> VehicleBody:
+        return VehicleBody(int(self.ids[slot]), int(self.colors[slot]), OVEN_TYPES[self.ovens[slot]])
+
     def remove_body(self) -> Optional[VehicleBody]:
-        if not self.is_available_output or len(self.queue) == 0:
+        if not self.is_available_output or self.size == 0:
             return None
-        return self.queue.popleft()
+        body = self._body_at(self.head)
+        self.head = (self.head + 1) % self.capacity
+        self.size -= 1
+        if self.size == 0:
+            self._front_color = None
+            self._rear_color = None
+            self._rear_run = 0
+            self._head_run = 0
+        else:
+            self._front_color = int(self.colors[self.head])
+            # Popping the head only shortens the rear run when the run spanned the whole line
+            self._rear_run = min(self._rear_run, self.size)
+            self._head_run -= 1
+            if self._head_run == 0:
+                self._head_run = self._count_head_run()
+        return body
+
+    def _count_head_run(self) -> int:
+        """Length of the same-color run at the head; only rescanned once the previous run is used up"""
+        colors, capacity, head, front = self.colors, self.capacity, self.head, self._front_color
+        run = 1
+        while run < self.size and colors[(head + run) % capacity] == front:
+            run += 1
+        return run
 
     def peek_head(self) -> Optional[VehicleBody]:
-        if len(self.queue) == 0:
+        if self.size == 0:
             return None
-        return self.queue[0]
+        return self._body_at(self.head)
+
+    def get_front_color_index(self) -> Optional[int]:
+        return self._front_color
+
+    def get_rear_color_index(self) -> Optional[int]:
+        return self._rear_color
+
+    def get_rear_run_length(self) -> int:
+        return self._rear_run
+
+    def get_head_run_length(self) -> int:
+        return self._head_run
+
+    def is_single_color(self) -> bool:
+        return self.size > 0 and self._rear_run == self.size
+
+    def get_colors(self) -> np.ndarray:
+        """Color indices in queue order (head first); a view unless the ring wraps"""
+        end = self.head + self.size
+        if end <= self.capacity:
+            return self.colors[self.head:end]
+        return np.concatenate((self.colors[self.head:], self.colors[:end - self.capacity]))
 
     def get_filled_length(self) -> int:
-        return len(self.queue)
+        return self.size
 
     def get_remaining_capacity(self) -> int:
-        return self.capacity - len(self.queue)
+        return self.capacity - self.size
+
+
+class TempBuffer:
+    """Growable FIFO ring of (color, id) pairs for vehicles an oven cannot place yet"""
+
+    def __init__(self, source_oven: OvenType, capacity: int = 256):
+        self.source_oven = source_oven
+        self.colors = np.empty(capacity, dtype=np.int16)
+        self.ids = np.empty(capacity, dtype=np.int32)
+        self.head = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        """Yield VehicleBody views in queue order (for display)"""
+        capacity = len(self.colors)
+        for offset in range(self.size):
+            yield self._body_at((self.head + offset) % capacity)
+
+    def _body_at(self, slot: int) -> VehicleBody:
+        return VehicleBody(int(self.ids[slot]), int(self.colors[slot]), self.source_oven)
+
+    def _grow(self):
+        order = (self.head + np.arange(self.size)) % len(self.colors)
+        colors = np.empty(2 * len(self.colors), dtype=np.int16)
+        ids = np.empty(2 * len(self.ids), dtype=np.int32)
+        colors[:self.size] = self.colors[order]
+        ids[:self.size] = self.ids[order]
+        self.colors, self.ids, self.head = colors, ids, 0
+
+    def append(self, body: VehicleBody):
+        if self.size == len(self.colors):
+            self._grow()
+        tail = (self.head + self.size) % len(self.colors)
+        self.colors[tail] = body.color
+        self.ids[tail] = body.body_id
+        self.size += 1
+
+    def peek(self) -> Optional[VehicleBody]:
+        return self._body_at(self.head) if self.size else None
+
+    def popleft(self) -> VehicleBody:
+        if self.size == 0:
+            raise IndexError("pop from an empty TempBuffer")
+        body = self._body_at(self.head)
+        self.head = (self.head + 1) % len(self.colors)
+        self.size -= 1
+        return body
+
+
+class MetricHistory:
+    """Per-cycle JPH, penalty and changeover totals of both systems in growable NumPy columns"""
+
+    # Round-robin columns are floats so cycles run without the comparison can hold NaN
+    FIELDS = (
+        ('cycle', np.int32),
+        ('optimized_jph', np.float64),
+        ('round_robin_jph', np.float64),
+        ('optimized_penalties', np.int32),
+        ('round_robin_penalties', np.float64),
+        ('optimized_changes', np.int32),
+        ('round_robin_changes', np.float64),
+    )
+    ROUND_ROBIN_FIELDS = ('round_robin_jph', 'round_robin_penalties', 'round_robin_changes')
+
+    def __init__(self, capacity: int = 1024):
+        self._columns: Dict[str, np.ndarray] = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.FIELDS}
+        self.size = 0
+        self._frames: Dict[tuple, Tuple[int, pd.DataFrame]] = {}  # Chart frames with the size they were built at
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _grow(self):
+        for name, column in self._columns.items():
+            grown = np.empty(2 * len(column), dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self._columns[name] = grown
+
+    def append(self, cycle: int, optimized: "_BaseConveyorSystem", round_robin: Optional["_BaseConveyorSystem"]):
+        """Record one cycle; round_robin is None while the comparison is off"""
+        if self.size == len(self._columns['cycle']):
+            self._grow()
+        i = self.size
+        columns = self._columns
+        columns['cycle'][i] = cycle
+        columns['optimized_jph'][i] = optimized.jph
+        columns['optimized_penalties'][i] = optimized.penaltyCount
+        columns['optimized_changes'][i] = optimized.color_changeovers
+        if round_robin is None:
+            for name in self.ROUND_ROBIN_FIELDS:
+                columns[name][i] = np.nan
+        else:
+            columns['round_robin_jph'][i] = round_robin.jph
+            columns['round_robin_penalties'][i] = round_robin.penaltyCount
+            columns['round_robin_changes'][i] = round_robin.color_changeovers
+        self.size = i + 1
+
+    def clear_round_robin(self):
+        """Blank the recorded round-robin values, e.g. when its baseline restarts"""
+        for name in self.ROUND_ROBIN_FIELDS:
+            self._columns[name][:self.size] = np.nan
+        self._frames.clear()
+
+    def column(self, name: str) -> np.ndarray:
+        """View of the recorded values of one field"""
+        return self._columns[name][:self.size]
+
+    def frame(self, labels: Dict[str, str]) -> pd.DataFrame:
+        """Cycle-indexed chart frame of the given fields (field -> label), rebuilt only after new records"""
+        key = tuple(labels.items())
+        cached = self._frames.get(key)
+        if cached is not None and cached[0] == self.size:
+            return cached[1]
+        frame = pd.DataFrame(
+            {label: self.column(name) for name, label in labels.items()},
+            index=pd.Index(self.column('cycle'), name='Cycle'),
+        )
+        self._frames[key] = (self.size, frame)
+        return frame
 
 
 # ------------------------------
-# SIMPLE ROUND-ROBIN CONVEYOR SYSTEM
+# SHARED CONVEYOR STATE
 # ------------------------------
 
-class SimpleRoundRobinConveyorSystem:
-    def __init__(self):
-        self.buffer_lines: Dict[str, BufferLine] = {}
-        for i in range(1, 5):  # L1-L4 for O1
-            self.buffer_lines[f"L{i}"] = BufferLine(f"L{i}", 14)
-        for i in range(5, 10):  # L5-L9 for O2
-            self.buffer_lines[f"L{i}"] = BufferLine(f"L{i}", 16)
+class _BaseConveyorSystem:
+    """Buffer lines, counters and line accessors shared by both placement strategies"""
 
-        self.main_conveyor_last_color: Optional[str] = None
+    def __init__(self):
+        # Lines are indexed like LINE_IDS; buffer_lines gives the id-keyed view
+        self._lines: List[BufferLine] = [
+            BufferLine(line_id, cfg["capacity"]) for line_id, cfg in BUFFER_CONFIG.items()
+        ]
+        self._buffer_lines: Optional[Dict[str, BufferLine]] = None
+        self._capacities = tuple(buf.capacity for buf in self._lines)
+
+        self.main_conveyor_last_color: Optional[int] = None
         self.color_changeovers = 0
         self.total_processed = 0
         self.body_counter = 0
         self.penaltyCount = 0
         self.o2Stopped = False
-        self.main_conveyor_sequence = []
-        
-        # Round-robin counters
-        self.o1_buffer_counter = 0
-        self.o2_buffer_counter = 0
-        self.conveyor_buffer_counter = 0
-        
+        # Latest extractions only; total_processed numbers them
+        self.main_conveyor_sequence = deque(maxlen=CONVEYOR_SEQUENCE_LEN)
+
         # Time tracking
         self.total_penalty_time = 0
-        self.jph = 0.0
-        self.start_time = time.time()
+        self._jph_key: Tuple[int, int] = (0, 0)
+        self._jph = 0.0
+
+    @property
+    def buffer_lines(self) -> Dict[str, BufferLine]:
+        """Line id -> BufferLine mapping for the UI and report, built on first use"""
+        if self._buffer_lines is None:
+            self._buffer_lines = dict(zip(LINE_IDS, self._lines))
+        return self._buffer_lines
+
+    def get_line(self, buffer_id: str) -> BufferLine:
+        return self._lines[LINE_INDEX[buffer_id]]
 
     def is_full(self, buffer_id: str) -> bool:
-        return self.buffer_lines[buffer_id].is_full()
+        return self._lines[LINE_INDEX[buffer_id]].is_full()
 
     def is_empty(self, buffer_id: str) -> bool:
-        return self.buffer_lines[buffer_id].is_empty()
+        return self._lines[LINE_INDEX[buffer_id]].is_empty()
 
     def get_space(self, buffer_id: str) -> int:
-        return self.buffer_lines[buffer_id].get_remaining_capacity()
+        return self._lines[LINE_INDEX[buffer_id]].get_remaining_capacity()
 
     def place_vehicle(self, buffer_id: str, body: VehicleBody) -> bool:
-        return self.buffer_lines[buffer_id].add_body(body)
+        return self._lines[LINE_INDEX[buffer_id]].add_body(body)
+
+    @property
+    def jph(self) -> float:
+        """JPH calculation: vehicles / (vehicles * 1s + penalty_time) × 3600, redone only when counters change"""
+        key = (self.total_processed, self.total_penalty_time)
+        if key != self._jph_key:
+            self._jph_key = key
+            total_effective_time = self.total_processed * PROCESSING_TIME_PER_VEHICLE + self.total_penalty_time
+            self._jph = (self.total_processed / total_effective_time) * 3600 if total_effective_time > 0 else 0.0
+        return self._jph
+
+    def get_time_breakdown(self) -> Dict[str, float]:
+        """Get time breakdown for display"""
+        base_time = self.total_processed * PROCESSING_TIME_PER_VEHICLE
+        total_time = base_time + self.total_penalty_time
+        return {
+            'base_processing_time': base_time,
+            'penalty_time': self.total_penalty_time,
+            'total_effective_time': total_time
+        }
+
+
+# ------------------------------
+# SIMPLE ROUND-ROBIN CONVEYOR SYSTEM
+# ------------------------------
+
+def rr_place(sizes: Sequence[int], caps: Sequence[int], order: Sequence[int], counter: int) -> Tuple[int, int]:
+    """Round-robin over `order` from `counter`; returns (first index with space, next counter) or (-1, counter)"""
+    n = len(order)
+    for i in range(n):
+        idx = order[(counter + i) % n]
+        if sizes[idx] < caps[idx]:
+            return idx, (counter + i + 1) % n
+    return -1, counter
+
+
+def rr_extract(sizes: Sequence[int], order: Sequence[int], counter: int) -> Tuple[int, int]:
+    """Round-robin over `order` from `counter`; returns (first non-empty index, next counter) or (-1, counter)"""
+    n = len(order)
+    for i in range(n):
+        idx = order[(counter + i) % n]
+        if sizes[idx] > 0:
+            return idx, (counter + i + 1) % n
+    return -1, counter
+
+
+class SimpleRoundRobinConveyorSystem(_BaseConveyorSystem):
+    def __init__(self):
+        super().__init__()
+        self._o1_order = tuple(LINE_INDEX[bid] for bid in O1_BUFFERS)
+        self._o2_order = tuple(LINE_INDEX[bid] for bid in O2_BUFFERS)
+        self._all_order = tuple(range(len(LINE_IDS)))
+        
+        # Round-robin counters
+        self.o1_buffer_counter = 0
+        self.o2_buffer_counter = 0
+        self.conveyor_buffer_counter = 0
 
     def simple_round_robin_placement(self, buffer_ids: List[str], body: VehicleBody) -> Optional[str]:
         """Simple round-robin placement without considering colors"""
-        start_index = self.o1_buffer_counter if buffer_ids == O1_BUFFERS else self.o2_buffer_counter
-        counter = start_index
-        
-        # Try all buffers in round-robin order
-        for _ in range(len(buffer_ids)):
-            buffer_id = buffer_ids[counter]
-            if not self.is_full(buffer_id):
-                # Update counter for next placement
-                if buffer_ids == O1_BUFFERS:
-                    self.o1_buffer_counter = (counter + 1) % len(buffer_ids)
-                else:
-                    self.o2_buffer_counter = (counter + 1) % len(buffer_ids)
-                return buffer_id
-            counter = (counter + 1) % len(buffer_ids)
-        
-        # All buffers are full
-        return None
+        sizes = [buf.size for buf in self._lines]
+        if buffer_ids == O1_BUFFERS:
+            idx, self.o1_buffer_counter = rr_place(sizes, self._capacities, self._o1_order, self.o1_buffer_counter)
+        else:
+            idx, self.o2_buffer_counter = rr_place(sizes, self._capacities, self._o2_order, self.o2_buffer_counter)
+        # -1 means all buffers are full
+        return LINE_IDS[idx] if idx >= 0 else None
 
     def place_for_o1(self, body: VehicleBody) -> Tuple[Optional[str], bool, bool]:
         """Place O1 vehicle using simple round-robin"""
@@ -219,72 +554,44 @@ class SimpleRoundRobinConveyorSystem:
 
     def simple_round_robin_extraction(self) -> Optional[str]:
         """Simple round-robin extraction from all buffers"""
-        start_index = self.conveyor_buffer_counter
-        all_buffers = list(self.buffer_lines.keys())
-        counter = start_index
-        
-        # Try all buffers in round-robin order
-        for _ in range(len(all_buffers)):
-            buffer_id = all_buffers[counter]
-            if not self.is_empty(buffer_id):
-                # Update counter for next extraction
-                self.conveyor_buffer_counter = (counter + 1) % len(all_buffers)
-                return buffer_id
-            counter = (counter + 1) % len(all_buffers)
-        
-        # All buffers are empty
-        return None
+        sizes = [buf.size for buf in self._lines]
+        idx, self.conveyor_buffer_counter = rr_extract(sizes, self._all_order, self.conveyor_buffer_counter)
+        # -1 means all buffers are empty
+        return LINE_IDS[idx] if idx >= 0 else None
 
     def select_buffer_for_main_conveyor(self) -> Optional[str]:
         """Select buffer for main conveyor using simple round-robin"""
         return self.simple_round_robin_extraction()
 
-    def update_jph(self):
-        """JPH calculation: vehicles / (vehicles * 1s + penalty_time) × 3600"""
-        base_processing_time = self.total_processed * PROCESSING_TIME_PER_VEHICLE
-        total_effective_time = base_processing_time + self.total_penalty_time
-        
-        if total_effective_time > 0:
-            self.jph = (self.total_processed / total_effective_time) * 3600
-        else:
-            self.jph = 0
-
-    def get_time_breakdown(self) -> Dict[str, float]:
-        """Get time breakdown for display"""
-        base_time = self.total_processed * PROCESSING_TIME_PER_VEHICLE
-        total_time = base_time + self.total_penalty_time
-        return {
-            'base_processing_time': base_time,
-            'penalty_time': self.total_penalty_time,
-            'total_effective_time': total_time
-        }
-
 
 # ------------------------------
 # OPTIMIZED CONVEYOR SYSTEM (with temp buffer)
 # ------------------------------
 
-class ConveyorSystem:
+def f1_select(state: Sequence[Tuple[bool, int, int, Optional[int], bool]], color: int) -> int:
+    """Index of the line f1 places on, or -1; state rows are (avail_in, size, capacity, rear_color, single_color)"""
+    # Same-color line still open for input
+    for i, (avail_in, size, capacity, rear_color, single_color) in enumerate(state):
+        if avail_in and single_color and rear_color == color and size < capacity:
+            return i
+    # Any line whose rear already matches
+    for i, (avail_in, size, capacity, rear_color, single_color) in enumerate(state):
+        if rear_color == color and size < capacity:
+            return i
+    # Empty line open for input
+    for i, (avail_in, size, capacity, rear_color, single_color) in enumerate(state):
+        if avail_in and size == 0:
+            return i
+    return -1
+
+
+class ConveyorSystem(_BaseConveyorSystem):
     def __init__(self):
-        self.buffer_lines: Dict[str, BufferLine] = {}
-        for i in range(1, 5):  # L1-L4 for O1
-            self.buffer_lines[f"L{i}"] = BufferLine(f"L{i}", 14)
-        for i in range(5, 10):  # L5-L9 for O2
-            self.buffer_lines[f"L{i}"] = BufferLine(f"L{i}", 16)
-
-        self.main_conveyor_last_color: Optional[str] = None
-        self.color_changeovers = 0
-        self.total_processed = 0
-        self.body_counter = 0
-        self.penaltyCount = 0
-        self.o2Stopped = False
-        self.main_conveyor_sequence = []
-        self.o2_temp_buffer: deque = deque()  # Temporary buffer for O2 when blocked
-        
-        # Time tracking
-        self.total_penalty_time = 0
-        self.jph = 0.0
-        self.start_time = time.time()
+        super().__init__()
+        self._o1_lines = tuple(O1_BUFFERS)
+        self._o2_lines = tuple(O2_BUFFERS)
+        self._o2_buffers = tuple(self._lines[LINE_INDEX[bid]] for bid in O2_BUFFERS)
+        self.o2_temp_buffer = TempBuffer(OvenType.O2)  # Temporary buffer for O2 when blocked
 
     def get_o1_lines(self) -> List[str]:
         return O1_BUFFERS
@@ -292,94 +599,58 @@ class ConveyorSystem:
     def get_o2_lines(self) -> List[str]:
         return O2_BUFFERS
 
-    def is_full(self, buffer_id: str) -> bool:
-        return self.buffer_lines[buffer_id].is_full()
-
-    def is_empty(self, buffer_id: str) -> bool:
-        return self.buffer_lines[buffer_id].is_empty()
-
-    def get_front_color(self, buffer_id: str) -> Optional[str]:
-        head = self.buffer_lines[buffer_id].peek_head()
-        return head.color if head else None
+    def get_front_color(self, buffer_id: str) -> Optional[int]:
+        return self._lines[LINE_INDEX[buffer_id]].get_front_color_index()
 
-    def get_rear_color(self, buffer_id: str) -> Optional[str]:
-        buf = self.buffer_lines[buffer_id].queue
-        return buf[-1].color if buf else None
+    def get_rear_color(self, buffer_id: str) -> Optional[int]:
+        return self._lines[LINE_INDEX[buffer_id]].get_rear_color_index()
 
     def get_rear_color_group_size(self, buffer_id: str) -> int:
-        buf = self.buffer_lines[buffer_id].queue
-        if not buf:
-            return 0
-        rear = buf[-1].color
-        count = 0
-        for body in reversed(buf):
-            if body.color == rear:
-                count += 1
-            else:
-                break
-        return count
+        return self._lines[LINE_INDEX[buffer_id]].get_rear_run_length()
 
-    def is_fully_of_color(self, buffer_id: str, color: str) -> bool:
-        buf = self.buffer_lines[buffer_id].queue
-        return len(buf) > 0 and all(body.color == color for body in buf)
+    def is_fully_of_color(self, buffer_id: str, color: int) -> bool:
+        buf = self._lines[LINE_INDEX[buffer_id]]
+        return buf.is_single_color() and buf.get_rear_color_index() == color
 
-    def ends_with_color(self, buffer_id: str, color: str) -> bool:
+    def ends_with_color(self, buffer_id: str, color: int) -> bool:
         rear = self.get_rear_color(buffer_id)
         return rear == color
 
-    def get_space(self, buffer_id: str) -> int:
-        return self.buffer_lines[buffer_id].get_remaining_capacity()
-
-    def place_vehicle(self, buffer_id: str, body: VehicleBody) -> bool:
-        return self.buffer_lines[buffer_id].add_body(body)
-
-    def f1(self, buffer_ids: List[str], color: str) -> Optional[str]:
-        for bid in buffer_ids:
-            buf = self.buffer_lines[bid]
-            if not buf.is_available_input:
-                continue
-            if self.is_fully_of_color(bid, color) and not self.is_full(bid):
-                return bid
+    def f1(self, buffer_ids: Sequence[str], color: int) -> Optional[str]:
+        state = tuple(
+            (buf.is_available_input, buf.size, buf.capacity, buf.get_rear_color_index(), buf.is_single_color())
+            for buf in (self._lines[LINE_INDEX[bid]] for bid in buffer_ids)
+        )
+        idx = f1_select(state, color)
+        return buffer_ids[idx] if idx >= 0 else None
+
+    def find_buffer_to_break(self, buffer_ids: Sequence[str], color: int) -> Optional[str]:
+        # Shortest rear color group first, then most free space; first line wins ties
+        best_bid = None
+        best_key = None
         for bid in buffer_ids:
-            buf = self.buffer_lines[bid]
-            if self.ends_with_color(bid, color) and not self.is_full(bid):
-                return bid
-        for bid in buffer_ids:
-            buf = self.buffer_lines[bid]
-            if not buf.is_available_input:
-                continue
-            if self.is_empty(bid):
-                return bid
-        return None
-
-    def find_buffer_to_break(self, buffer_ids: List[str], color: str) -> Optional[str]:
-        candidates = []
-        for bid in buffer_ids:
-            buf = self.buffer_lines[bid]
+            buf = self._lines[LINE_INDEX[bid]]
             # Skip buffers closed for input or already full
-            if not buf.is_available_input or buf.is_full():
+            if not buf.is_available_input or buf.size >= buf.capacity:
                 continue
-            
-            group_sz = self.get_rear_color_group_size(bid)
-            space = self.get_space(bid)
-            candidates.append((bid, group_sz, space))
-        if not candidates:
-            return None
-        candidates.sort(key=lambda x: (x[1], -x[2]))
-        return candidates[0][0]
+            key = (buf.get_rear_run_length(), buf.size - buf.capacity)
+            if best_key is None or key < best_key:
+                best_key = key
+                best_bid = bid
+        return best_bid
 
     def place_for_o1(self, body: VehicleBody) -> Tuple[Optional[str], bool, bool]:
         self.o2Stopped = False
         penalty_applied = False
         
         # First try O1 buffers (L1-L4)
-        bid = self.f1(O1_BUFFERS, body.color)
+        bid = self.f1(self._o1_lines, body.color)
         if bid:
             self.place_vehicle(bid, body)
             return bid, False, penalty_applied
 
         # If O1 buffers are full, try O2 buffers (L5-L9) with penalty
-        bid = self.f1(O2_BUFFERS, body.color)
+        bid = self.f1(self._o2_lines, body.color)
         if bid:
             self.penaltyCount += 1
             self.o2Stopped = True
@@ -389,12 +660,12 @@ class ConveyorSystem:
             penalty_applied = True
             return bid, True, penalty_applied
 
-        bid = self.find_buffer_to_break(O1_BUFFERS, body.color)
+        bid = self.find_buffer_to_break(self._o1_lines, body.color)
         if bid:
             self.place_vehicle(bid, body)
             return bid, False, penalty_applied
 
-        bid = self.find_buffer_to_break(O2_BUFFERS, body.color)
+        bid = self.find_buffer_to_break(self._o2_lines, body.color)
         if bid:
             self.penaltyCount += 1
             self.o2Stopped = True
@@ -413,11 +684,11 @@ class ConveyorSystem:
             return "TMP_BUFFER"
         
         # Only process normally if temp buffer is empty and O2 is not blocked
-        bid = self.f1(O2_BUFFERS, body.color)
+        bid = self.f1(self._o2_lines, body.color)
         if bid:
             self.place_vehicle(bid, body)
             return bid
-        bid = self.find_buffer_to_break(O2_BUFFERS, body.color)
+        bid = self.find_buffer_to_break(self._o2_lines, body.color)
         if bid:
             self.place_vehicle(bid, body)
             return bid
@@ -428,116 +699,93 @@ class ConveyorSystem:
         if not self.o2_temp_buffer or self.o2Stopped:
             return None
         
-        body = self.o2_temp_buffer.popleft()
-        bid = self.f1(O2_BUFFERS, body.color)
-        if bid:
-            self.place_vehicle(bid, body)
-            return (body, bid)
-        bid = self.find_buffer_to_break(O2_BUFFERS, body.color)
-        if bid:
-            self.place_vehicle(bid, body)
-            return (body, bid)
-        # If still can't place, put it back
-        self.o2_temp_buffer.appendleft(body)
-        return None
-
-    def f1_find_max_connected_color(self) -> Optional[str]:
-        color_counts: Dict[str, int] = {}
-        buffer_meta = {}
-        for line_id, buffer_line in self.buffer_lines.items():
-            if buffer_line.is_empty() or not buffer_line.is_available_output:
-                continue
-            head_color = buffer_line.peek_head().color
-            count = 0
-            for body in buffer_line.queue:
-                if body.color == head_color:
-                    count += 1
-                else:
-                    break
-            color_counts[head_color] = max(color_counts.get(head_color, 0), count)
-            remaining_capacity = buffer_line.get_remaining_capacity()
-            if head_color not in buffer_meta or count > buffer_meta[head_color][1]:
-                buffer_meta[head_color] = (line_id, count, remaining_capacity)
-        if not color_counts:
-            return None
-        max_freq = max(color_counts.values())
-        candidates = [c for c in color_counts if color_counts[c] == max_freq]
-        if len(candidates) == 1:
-            return candidates[0]
-        best_color = None
-        best_tuple = None
-        for color in candidates:
-            line_id, connected_count, remaining_capacity = buffer_meta[color]
-            current_tuple = (remaining_capacity, -connected_count, line_id)
-            if best_tuple is None or current_tuple < best_tuple:
-                best_tuple = current_tuple
-                best_color = color
-        return best_color
-
-    def f2_choose_buffer_for_color(self, target_color: str) -> Optional[str]:
-        candidate_lines = []
-        for line_id, buffer_line in self.buffer_lines.items():
-            if buffer_line.is_empty() or not buffer_line.is_available_output:
-                continue
-            head_body = buffer_line.peek_head()
-            if head_body and head_body.color == target_color:
-                remaining_capacity = buffer_line.get_remaining_capacity()
-                candidate_lines.append((line_id, remaining_capacity))
-        if not candidate_lines:
+        body = self.o2_temp_buffer.peek()
+        bid = self.f1(self._o2_lines, body.color)
+        if not bid:
+            bid = self.find_buffer_to_break(self._o2_lines, body.color)
+        if not bid:
+            # Can't place yet; the vehicle stays at the head of the temp buffer
             return None
-        candidate_lines.sort(key=lambda x: x[1])
-        return candidate_lines[0][0]
+        self.o2_temp_buffer.popleft()
+        self.place_vehicle(bid, body)
+        return (body, bid)
 
     def are_all_o2_buffers_full(self) -> bool:
-        for line_id in O2_BUFFERS:
-            buf = self.buffer_lines[line_id]
-            if buf.is_available_input and not buf.is_full():
+        for buf in self._o2_buffers:
+            if buf.is_available_input and buf.size < buf.capacity:
                 return False
         return True
 
     def select_buffer_for_main_conveyor(self) -> Optional[str]:
-        if self.are_all_o2_buffers_full():
-            max_color = self.f1_find_max_connected_color()
-            if max_color:
-                return self.f2_choose_buffer_for_color(max_color)
+        # One pass over the open, non-empty lines, keyed by head color:
+        # fullest: color -> (remaining, index) of its fullest line
+        # longest: color -> (head run, remaining, index) of its first line with its longest head run
+        fullest: Dict[int, Tuple[int, int]] = {}
+        longest: Dict[int, Tuple[int, int, int]] = {}
+        for i, buf in enumerate(self._lines):
+            if not buf.is_available_output or buf.size == 0:
+                continue
+            color = buf.get_front_color_index()
+            remaining = buf.capacity - buf.size
+            best = fullest.get(color)
+            if best is None or remaining < best[0]:
+                fullest[color] = (remaining, i)
+            run = buf.get_head_run_length()
+            known = longest.get(color)
+            if known is None or run > known[0]:
+                longest[color] = (run, remaining, i)
+        if not fullest:
             return None
-        if self.main_conveyor_last_color:
-            matching_buffers = []
-            for line_id, buffer_line in self.buffer_lines.items():
-                if buffer_line.is_empty() or not buffer_line.is_available_output:
-                    continue
-                head_body = buffer_line.peek_head()
-                if head_body and head_body.color == self.main_conveyor_last_color:
-                    remaining_capacity = buffer_line.get_remaining_capacity()
-                    matching_buffers.append((line_id, remaining_capacity))
-            if len(matching_buffers) == 1:
-                return matching_buffers[0][0]
-            elif len(matching_buffers) > 1:
-                matching_buffers.sort(key=lambda x: x[1])
-                return matching_buffers[0][0]
-        max_color = self.f1_find_max_connected_color()
-        if max_color:
-            return self.f2_choose_buffer_for_color(max_color)
-        return None
 
-    def update_jph(self):
-        """JPH calculation: vehicles / (vehicles * 1s + penalty_time) × 3600"""
-        base_processing_time = self.total_processed * PROCESSING_TIME_PER_VEHICLE
-        total_effective_time = base_processing_time + self.total_penalty_time
-        
-        if total_effective_time > 0:
-            self.jph = (self.total_processed / total_effective_time) * 3600
-        else:
-            self.jph = 0
-
-    def get_time_breakdown(self) -> Dict[str, float]:
-        """Get time breakdown for display"""
-        base_time = self.total_processed * PROCESSING_TIME_PER_VEHICLE
-        total_time = base_time + self.total_penalty_time
+        # Continue the current color from the fullest matching line while O2 still has room
+        last_color = self.main_conveyor_last_color
+        if last_color in fullest and not self.are_all_o2_buffers_full():
+            return LINE_IDS[fullest[last_color][1]]
+
+        # Otherwise follow the longest head run; ties between colors go to the fuller line, then line order
+        top_run = max(run for run, _, _ in longest.values())
+        _, _, color = min((remaining, i, color) for color, (run, remaining, i) in longest.items() if run == top_run)
+        return LINE_IDS[fullest[color][1]]
+
+    def step_batch(self, o1_colors: np.ndarray, o2_colors: np.ndarray) -> Dict[str, object]:
+        """Run one full cycle per color pair without any UI bookkeeping.
+
+        Returns the counter deltas and the color indices sent to the main conveyor.
+        """
+        processed_before = self.total_processed
+        changeovers_before = self.color_changeovers
+        penalties_before = self.penaltyCount
+        penalty_time_before = self.total_penalty_time
+        sequence = np.empty(len(o1_colors), dtype=np.int16)
+        n_out = 0
+        body_id = self.body_counter
+
+        for o1_color, o2_color in zip(o1_colors.tolist(), o2_colors.tolist()):
+            self.place_for_o1(VehicleBody(body_id + 1, o1_color, OvenType.O1))
+            o2_body = VehicleBody(body_id + 2, o2_color, OvenType.O2)
+            body_id += 2
+            self.process_o2_temp_buffer()
+            self.place_for_o2(o2_body)
+
+            bid = self.select_buffer_for_main_conveyor()
+            body = self._lines[LINE_INDEX[bid]].remove_body() if bid else None
+            if body is None:
+                continue
+            color_change = self.main_conveyor_last_color is not None and self.main_conveyor_last_color != body.color
+            self.color_changeovers += color_change
+            self.total_penalty_time += color_change * PENALTY_TIME_COLOR_CHANGE
+            self.main_conveyor_last_color = body.color
+            self.total_processed += 1
+            sequence[n_out] = body.color
+            n_out += 1
+
+        self.body_counter = body_id
         return {
-            'base_processing_time': base_time,
-            'penalty_time': self.total_penalty_time,
-            'total_effective_time': total_time
+            'processed': self.total_processed - processed_before,
+            'color_changeovers': self.color_changeovers - changeovers_before,
+            'penalties': self.penaltyCount - penalties_before,
+            'penalty_time': self.total_penalty_time - penalty_time_before,
+            'sequence': sequence[:n_out],
         }
 
 
@@ -545,33 +793,36 @@ class ConveyorSystem:
 # REPORT GENERATION FUNCTIONS
 # ------------------------------
 
+_BARS = tuple('█' * i for i in range(51))  # Text bar of each width, indexed instead of rebuilt per row
+
+
 def format_color_distribution(color_counts, total):
     """Format color distribution statistics"""
     if not color_counts:
         return "   No data available"
     
-    result = ""
+    lines = []
     for color in sorted(color_counts.keys()):
         count = color_counts[color]
         percentage = (count / total * 100) if total > 0 else 0
-        bar = '█' * int(percentage / 2)
-        result += f"   {color:>4}: {count:>4} vehicles ({percentage:>5.2f}%) {bar}\n"
+        bar = _BARS[min(50, int(percentage / 2))]
+        lines.append(f"   {COLOR_NAMES[color]:>4}: {count:>4} vehicles ({percentage:>5.2f}%) {bar}")
     
-    return result.strip()
+    return "\n".join(lines).strip()
 
 
 def format_buffer_stats(buffer_stats):
     """Format buffer statistics"""
-    result = ""
+    lines = []
     for line_id in sorted(buffer_stats.keys()):
         stats = buffer_stats[line_id]
         capacity = stats['capacity']
         filled = stats['filled']
         utilization = stats['utilization']
-        bar = '█' * int(utilization / 5)
-        result += f"   {line_id}: {filled:>2}/{capacity:>2} ({utilization:>5.2f}%) {bar}\n"
+        bar = _BARS[min(20, int(utilization / 5))]
+        lines.append(f"   {line_id}: {filled:>2}/{capacity:>2} ({utilization:>5.2f}%) {bar}")
     
-    return result.strip()
+    return "\n".join(lines).strip()
 
 
 def generate_recommendations(changeover_rate, penalties, total_cycles, utilization, overflows):
@@ -606,107 +857,188 @@ def generate_recommendations(changeover_rate, penalties, total_cycles, utilizati
 
 def format_recent_activity():
     """Format recent activity log"""
-    activities = st.session_state.recent_placements[:20]
+    activities = first_n(st.session_state.recent_placements, 20)
     if not activities:
         return "   No activity recorded yet."
     
-    result = ""
+    parts = []
     for activity in activities:
-        cycle = activity['cycle']
-        activity_type = activity.get('type', 'Full Cycle')
-        result += f"\n   Cycle {cycle} - {activity_type}:\n"
+        parts.append(f"\n   Cycle {activity.cycle} - {activity.kind}:\n")
         
-        if 'o1' in activity:
-            o1 = activity['o1']
-            penalty_marker = " ⚠️ PENALTY" if o1.get('penalty') else ""
-            result += f"      O1: {o1['color']} → Buffer {o1['buffer']}{penalty_marker}\n"
+        if activity.o1_color is not None:
+            penalty_marker = " ⚠️ PENALTY" if activity.o1_penalty else ""
+            parts.append(f"      O1: {COLOR_NAMES[activity.o1_color]} → Buffer {activity.o1_buffer}{penalty_marker}\n")
         
-        if 'o2' in activity:
-            o2 = activity['o2']
-            buffer_display = o2['buffer'] if o2['buffer'] != 'TMP_BUFFER' else 'Temp Buffer (Blocked)'
-            result += f"      O2: {o2['color']} → {buffer_display}\n"
+        if activity.o2_color is not None:
+            buffer_display = activity.o2_buffer if activity.o2_buffer != 'TMP_BUFFER' else 'Temp Buffer (Blocked)'
+            parts.append(f"      O2: {COLOR_NAMES[activity.o2_color]} → {buffer_display}\n")
         
-        if 'o2_temp_processed' in activity:
-            tmp = activity['o2_temp_processed']
-            result += f"      O2 Temp→Buffer: {tmp['color']} (ID #{tmp['id']}) → {tmp['buffer']}\n"
+        if activity.tmp_color is not None:
+            parts.append(f"      O2 Temp→Buffer: {COLOR_NAMES[activity.tmp_color]} (ID #{activity.tmp_id}) → {activity.tmp_buffer}\n")
         
-        if 'conveyor' in activity:
-            conv = activity['conveyor']
-            result += f"      Main Conveyor: {conv['color']} (ID #{conv['id']}) ← from {conv['buffer']}\n"
+        if activity.conv_color is not None:
+            parts.append(f"      Main Conveyor: {COLOR_NAMES[activity.conv_color]} (ID #{activity.conv_id}) ← from {activity.conv_buffer}\n")
     
-    return result
+    return "".join(parts)
 
 
 def format_conveyor_sequence():
     """Format main conveyor sequence"""
-    sequence = st.session_state.system.main_conveyor_sequence[-50:]
-    if not sequence:
+    system = st.session_state.system
+    if not system.main_conveyor_sequence:
         return "   No vehicles processed yet."
     
-    result = ""
-    for i, vehicle in enumerate(reversed(sequence), 1):
-        result += f"   {len(st.session_state.system.main_conveyor_sequence) - i + 1:>4}. {vehicle['color']:>4} (ID #{vehicle['id']:<4}) from {vehicle['buffer']}\n"
-    
-    return result.strip()
+    total = system.total_processed
+    return "\n".join(
+        f"   {total - i + 1:>4}. {COLOR_NAMES[vehicle['color']]:>4} (ID #{vehicle['id']:<4}) from {vehicle['buffer']}"
+        for i, vehicle in enumerate(reversed(system.main_conveyor_sequence), 1)
+    ).strip()
 
 
-def generate_pdf_report() -> BytesIO:
-    """Generate a comprehensive PDF report"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Define styles
-    styles = getSampleStyleSheet()
+# PDF styles: Streamlit re-executes this module on every rerun, so they are built on the
+# first report and then shared by every later one
+@st.cache_resource(show_spinner=False)
+def _pdf_styles() -> Dict[str, object]:
+    """Paragraph and table styles used by _build_pdf"""
+    sheet = getSampleStyleSheet()
     title_style = ParagraphStyle(
         'CustomTitle',
-        parent=styles['Heading1'],
+        parent=sheet['Heading1'],
         fontSize=24,
         textColor=colors.HexColor('#1f4788'),
         spaceAfter=30,
         alignment=TA_CENTER,
         fontName='Helvetica-Bold'
     )
-    
+
     heading_style = ParagraphStyle(
         'CustomHeading',
-        parent=styles['Heading2'],
+        parent=sheet['Heading2'],
         fontSize=16,
         textColor=colors.HexColor('#1f4788'),
         spaceAfter=12,
         spaceBefore=12,
         fontName='Helvetica-Bold'
     )
-    
+
     subheading_style = ParagraphStyle(
         'CustomSubHeading',
-        parent=styles['Heading3'],
+        parent=sheet['Heading3'],
         fontSize=12,
         textColor=colors.HexColor('#2c5aa0'),
         spaceAfter=6,
         spaceBefore=6,
         fontName='Helvetica-Bold'
     )
-    
-    normal_style = styles['Normal']
+
+    normal_style = sheet['Normal']
     normal_style.fontSize = 10
     normal_style.leading = 14
+
+    # Body styles carry their own trailing space so no separate Spacer flowables are needed
+    section_style = ParagraphStyle('SectionBody', parent=normal_style, spaceAfter=0.2*inch)
+    activity_style = ParagraphStyle('ActivityEntry', parent=normal_style, spaceAfter=0.1*inch)
+
+    metadata_table = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f0f7')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ])
+
+    kpi_table = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ])
+
+    buffer_table = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5aa0')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ])
+
+    return {
+        'title': title_style,
+        'heading': heading_style,
+        'subheading': subheading_style,
+        'normal': normal_style,
+        'section': section_style,
+        'activity': activity_style,
+        'metadata_table': metadata_table,
+        'kpi_table': kpi_table,
+        'buffer_table': buffer_table,
+    }
+
+
+# Insight texts for consecutive value bands; band i covers values below _THRESHOLDS[i]
+_CHANGEOVER_THRESHOLDS = (30, 50)
+_CHANGEOVER_INSIGHTS = (
+    'Excellent color sequencing - minimal changeovers.',
+    'High changeover rate detected. Consider improving color batching strategy.',
+    'Critical: Very high changeover rate. Buffer sequencing algorithm needs optimization.',
+)
+_UTILIZATION_THRESHOLDS = (30, math.nextafter(70, math.inf))  # 70% itself still counts as balanced
+_UTILIZATION_INSIGHTS = (
+    'Warning: Buffer utilization is suboptimal. Review allocation strategy.',
+    'Balanced buffer utilization across the system.',
+    'Critical: Buffers near capacity. Risk of bottlenecks.',
+)
+
+
+def pick_insight(value: float, thresholds: Sequence[float], insights: Sequence[str]) -> str:
+    """Insight text for the band that value falls into"""
+    return insights[bisect_right(thresholds, value)]
+
+
+def _build_pdf(summary: tuple, buffer_fill: Tuple[Tuple[str, int, int], ...], activities: Tuple[str, ...],
+               generated_at: float, runtime_seconds: float) -> bytes:
+    """Render the report PDF from a snapshot of the simulation state and the time it was requested"""
+    (start_time, total_cycles, total_processed, changeovers, penalties, buffer_overflows,
+     last_color, temp_queue, o2_stopped) = summary
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
     
-    # Get system data
-    system = st.session_state.system
-    current_time = datetime.datetime.now()
-    start_time = st.session_state.simulation_start_time
-    runtime_delta = current_time - start_time
+    # Container for the 'Flowable' objects
+    elements = []
     
-    # Calculate metrics
-    total_cycles = st.session_state.cycle
-    total_processed = system.total_processed
-    changeovers = system.color_changeovers
-    penalties = system.penaltyCount
-    buffer_overflows = st.session_state.buffer_overflow_count
+    styles = _pdf_styles()
+    title_style = styles['title']
+    heading_style = styles['heading']
+    subheading_style = styles['subheading']
+    normal_style = styles['normal']
+    section_style = styles['section']
+    activity_style = styles['activity']
+    
+    current_time = time.localtime(generated_at)
     
+    # Calculate metrics
     if total_cycles > 0:
         avg_jobs_per_hour = (total_processed / total_cycles) * 60
     else:
@@ -722,9 +1054,7 @@ def generate_pdf_report() -> BytesIO:
     total_capacity = 0
     total_filled = 0
     
-    for line_id, buffer_line in system.buffer_lines.items():
-        capacity = buffer_line.capacity
-        filled = buffer_line.get_filled_length()
+    for line_id, capacity, filled in buffer_fill:
         utilization = (filled / capacity * 100) if capacity > 0 else 0
         buffer_stats[line_id] = {
             'capacity': capacity,
@@ -736,12 +1066,6 @@ def generate_pdf_report() -> BytesIO:
     
     overall_utilization = (total_filled / total_capacity * 100) if total_capacity > 0 else 0
     
-    # Color distribution analysis
-    color_counts = {}
-    for vehicle_data in system.main_conveyor_sequence:
-        color = vehicle_data['color']
-        color_counts[color] = color_counts.get(color, 0) + 1
-    
     # Title Page
     elements.append(Spacer(1, 1*inch))
     elements.append(Paragraph("TATA MOTORS", title_style))
@@ -750,26 +1074,14 @@ def generate_pdf_report() -> BytesIO:
     
     # Report metadata
     metadata_data = [
-        ['Report Generated:', current_time.strftime('%Y-%m-%d %H:%M:%S')],
-        ['Simulation Started:', start_time.strftime('%Y-%m-%d %H:%M:%S')],
-        ['Total Runtime:', f"{runtime_delta.total_seconds():.2f} seconds ({runtime_delta.total_seconds()/60:.2f} minutes)"],
-        ['Report ID:', f"RPT-{current_time.strftime('%Y%m%d-%H%M%S')}"]
+        ['Report Generated:', time.strftime('%Y-%m-%d %H:%M:%S', current_time)],
+        ['Simulation Started:', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))],
+        ['Total Runtime:', f"{runtime_seconds:.2f} seconds ({runtime_seconds/60:.2f} minutes)"],
+        ['Report ID:', f"RPT-{time.strftime('%Y%m%d-%H%M%S', current_time)}"]
     ]
     
     metadata_table = Table(metadata_data, colWidths=[2*inch, 4*inch])
-    metadata_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#e8f0f7')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    metadata_table.setStyle(styles['metadata_table'])
     
     elements.append(metadata_table)
     elements.append(PageBreak())
@@ -786,29 +1098,14 @@ def generate_pdf_report() -> BytesIO:
         ['Buffer Overflows', str(buffer_overflows), 'Bottleneck detection'],
         ['O1 Penalties', str(penalties), 'Improper routing'],
         ['Avg Jobs/Hour (est.)', f"{avg_jobs_per_hour:.2f}", 'Productivity measure'],
-        ['Last Processed Color', system.main_conveyor_last_color if system.main_conveyor_last_color else 'N/A', 'Continuity analysis'],
-        ['O2 Temp Buffer Queue', str(len(system.o2_temp_buffer)), 'Blocking status']
+        ['Last Processed Color', COLOR_NAMES[last_color] if last_color is not None else 'N/A', 'Continuity analysis'],
+        ['O2 Temp Buffer Queue', str(temp_queue), 'Blocking status']
     ]
     
     kpi_table = Table(kpi_data, colWidths=[2.5*inch, 1.5*inch, 2*inch])
-    kpi_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
+    kpi_table.setStyle(styles['kpi_table'])
     
     elements.append(kpi_table)
-    elements.append(Spacer(1, 0.3*inch))
     
     
     # Detailed Analysis
@@ -824,8 +1121,7 @@ def generate_pdf_report() -> BytesIO:
     <b>Estimated production rate:</b> {avg_jobs_per_hour:.2f} vehicles/hour<br/><br/>
     <b>INSIGHT:</b> {'Production rate is optimal.' if avg_jobs_per_hour >= 50 else 'Production rate needs improvement. Consider optimizing buffer allocation.'}
     """
-    elements.append(Paragraph(throughput_text, normal_style))
-    elements.append(Spacer(1, 0.2*inch))
+    elements.append(Paragraph(throughput_text, section_style))
     
     # 2. Color Changeover Analysis
     elements.append(Paragraph("2. Color Changeover Analysis", subheading_style))
@@ -833,10 +1129,9 @@ def generate_pdf_report() -> BytesIO:
     <b>Total changeovers:</b> {changeovers}<br/>
     <b>Changeover rate:</b> {changeover_rate:.2f}%<br/>
     <b>Average vehicles between changeovers:</b> {(total_processed/changeovers) if changeovers > 0 else total_processed:.2f}<br/><br/>
-    <b>INSIGHT:</b> {'Excellent color sequencing - minimal changeovers.' if changeover_rate < 30 else 'High changeover rate detected. Consider improving color batching strategy.' if changeover_rate < 50 else 'Critical: Very high changeover rate. Buffer sequencing algorithm needs optimization.'}
+    <b>INSIGHT:</b> {pick_insight(changeover_rate, _CHANGEOVER_THRESHOLDS, _CHANGEOVER_INSIGHTS)}
     """
-    elements.append(Paragraph(changeover_text, normal_style))
-    elements.append(Spacer(1, 0.2*inch))
+    elements.append(Paragraph(changeover_text, section_style))
     
     # 3. Buffer Utilization
     elements.append(Paragraph("3. Buffer Utilization Analysis", subheading_style))
@@ -845,7 +1140,7 @@ def generate_pdf_report() -> BytesIO:
     
     # Buffer utilization table
     buffer_util_data = [['Buffer ID', 'Filled/Capacity', 'Utilization %']]
-    for line_id in sorted(buffer_stats.keys()):
+    for line_id in SORTED_LINE_IDS:
         stats = buffer_stats[line_id]
         buffer_util_data.append([
             line_id,
@@ -854,27 +1149,13 @@ def generate_pdf_report() -> BytesIO:
         ])
     
     buffer_table = Table(buffer_util_data, colWidths=[1.5*inch, 2*inch, 2*inch])
-    buffer_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c5aa0')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-    ]))
+    buffer_table.setStyle(styles['buffer_table'])
     
     elements.append(buffer_table)
     elements.append(Spacer(1, 0.15*inch))
     
-    buffer_insight = f"<b>INSIGHT:</b> {'Balanced buffer utilization across the system.' if 30 <= overall_utilization <= 70 else 'Warning: Buffer utilization is suboptimal. Review allocation strategy.' if overall_utilization < 30 else 'Critical: Buffers near capacity. Risk of bottlenecks.'}"
-    elements.append(Paragraph(buffer_insight, normal_style))
-    elements.append(Spacer(1, 0.2*inch))
+    buffer_insight = f"<b>INSIGHT:</b> {pick_insight(overall_utilization, _UTILIZATION_THRESHOLDS, _UTILIZATION_INSIGHTS)}"
+    elements.append(Paragraph(buffer_insight, section_style))
     
     # 4. O1 Penalty Analysis
     elements.append(Paragraph("4. O1 Penalty Analysis", subheading_style))
@@ -885,138 +1166,187 @@ def generate_pdf_report() -> BytesIO:
     <b>O1 vehicles routed to O2 buffers:</b> {penalties}<br/><br/>
     <b>INSIGHT:</b> {'No routing issues detected.' if penalties == 0 else 'Minor routing inefficiency detected.' if penalties < total_cycles * 0.1 else 'Significant routing issues. O1 buffers frequently full, causing O2 buffer usage.'}
     """
-    elements.append(Paragraph(penalty_text, normal_style))
-    elements.append(Spacer(1, 0.2*inch))
+    elements.append(Paragraph(penalty_text, section_style))
     
     # 5. Blocking Analysis
     elements.append(Paragraph("5. Blocking & Overflow Analysis", subheading_style))
     blocking_text = f"""
     <b>Buffer overflows detected:</b> {buffer_overflows}<br/>
-    <b>O2 temporary buffer queue:</b> {len(system.o2_temp_buffer)} vehicles waiting<br/>
-    <b>O2 blocked status:</b> {'ACTIVE' if system.o2Stopped else 'NORMAL'}<br/><br/>
-    <b>INSIGHT:</b> {'No blocking issues. System operating smoothly.' if buffer_overflows == 0 and len(system.o2_temp_buffer) == 0 else 'System experiencing blocking. Consider increasing buffer capacity or optimizing placement logic.'}
+    <b>O2 temporary buffer queue:</b> {temp_queue} vehicles waiting<br/>
+    <b>O2 blocked status:</b> {'ACTIVE' if o2_stopped else 'NORMAL'}<br/><br/>
+    <b>INSIGHT:</b> {'No blocking issues. System operating smoothly.' if buffer_overflows == 0 and temp_queue == 0 else 'System experiencing blocking. Consider increasing buffer capacity or optimizing placement logic.'}
     """
-    elements.append(Paragraph(blocking_text, normal_style))
-    elements.append(Spacer(1, 0.3*inch))
+    elements.append(Paragraph(blocking_text, section_style))
     
     # Recent Activity
     elements.append(PageBreak())
     elements.append(Paragraph("RECENT ACTIVITY LOG (Last 15 Cycles)", heading_style))
     
-    activities = st.session_state.recent_placements[:15]
     if activities:
-        for activity in activities:
-            cycle = activity['cycle']
-            activity_type = activity.get('type', 'Full Cycle')
-            activity_text = f"<b>Cycle {cycle} - {activity_type}:</b><br/>"
-            
-            if 'o1' in activity:
-                o1 = activity['o1']
-                penalty_marker = " ⚠️ PENALTY" if o1.get('penalty') else " ✅"
-                activity_text += f"&nbsp;&nbsp;&nbsp;&nbsp;O1: {o1['color']} → Buffer {o1['buffer']}{penalty_marker}<br/>"
-            
-            if 'o2' in activity:
-                o2 = activity['o2']
-                buffer_display = o2['buffer'] if o2['buffer'] != 'TMP_BUFFER' else 'Temp Buffer (Blocked)'
-                activity_text += f"&nbsp;&nbsp;&nbsp;&nbsp;O2: {o2['color']} → {buffer_display}<br/>"
-            
-            if 'conveyor' in activity:
-                conv = activity['conveyor']
-                activity_text += f"&nbsp;&nbsp;&nbsp;&nbsp;Main Conveyor: {conv['color']} (ID #{conv['id']}) ← from {conv['buffer']}<br/>"
-            
-            elements.append(Paragraph(activity_text, normal_style))
-            elements.append(Spacer(1, 0.1*inch))
+        for pdf_html in activities:
+            elements.append(Paragraph(pdf_html, activity_style))
     else:
         elements.append(Paragraph("No activity recorded yet.", normal_style))
     
     
     # Build PDF
     doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
+
+
+def generate_pdf_report() -> BytesIO:
+    """Generate a comprehensive PDF report"""
+    system = st.session_state.system
+    summary = (
+        st.session_state.simulation_start_time,
+        st.session_state.cycle,
+        system.total_processed,
+        system.color_changeovers,
+        system.penaltyCount,
+        st.session_state.buffer_overflow_count,
+        system.main_conveyor_last_color,
+        len(system.o2_temp_buffer),
+        system.o2Stopped,
+    )
+    buffer_fill = tuple(
+        (line_id, buffer_line.capacity, buffer_line.get_filled_length())
+        for line_id, buffer_line in system.buffer_lines.items()
+    )
+    activities = tuple(activity_entry(activity).pdf_html for activity in first_n(st.session_state.recent_placements, 15))
+    # Wall-clock time is only formatted; the runtime comes from the monotonic clock
+    generated_at = time.time()
+    runtime_seconds = (time.monotonic_ns() - st.session_state.simulation_start_ns) / 1e9
+    return BytesIO(_build_pdf(summary, buffer_fill, activities, generated_at, runtime_seconds))
 
 
 # ------------------------------
 # STREAMLIT UI
 # ------------------------------
 
-def render_color_box(color: str, size: int = 20):
+def _color_box_html(color: int, size: int) -> str:
+    hex_color = COLOR_MAP_BY_IDX[color]
+    return f'<div style="display:inline-block; width:{size}px; height:{size}px; background-color:{hex_color}; border:1px solid #333; border-radius:3px; margin:2px;" title="{COLOR_NAMES[color]}"></div>'
+
+
+# Markup for every palette color at the sizes the UI uses, built once at import
+_COLOR_BOX_CACHE: Dict[Tuple[int, int], str] = {
+    (color, size): _color_box_html(color, size) for color in range(len(COLOR_NAMES)) for size in (20, 25, 30, 40)
+}
+
+# Buffer-line slot per color, indexed by color
+_BUFFER_BOX_HTML: Tuple[str, ...] = tuple(
+    f'<div style="width:25px; height:25px; background-color:{hex_color}; border:1px solid #333; border-radius:3px; display:inline-flex; align-items:center; justify-content:center; font-size:8px; color:#fff; font-weight:bold;" title="{name}"></div>'
+    for hex_color, name in zip(COLOR_MAP_BY_IDX, COLOR_NAMES)
+)
+_EMPTY_BOX_25 = '<div style="width:25px; height:25px; background-color:#2a2a2a; border:1px dashed #555; border-radius:3px; display:inline-flex;" title="Empty"></div>'
+_BOX_ROW_OPEN = '<div style="display: flex; align-items: center; gap: 10px; flex-wrap: wrap;">'
+
+
+def render_color_box(color: int, size: int = 20):
     """Render a colored box with HTML"""
-    hex_color = COLOR_MAP.get(color, "#888888")
-    return f'<div style="display:inline-block; width:{size}px; height:{size}px; background-color:{hex_color}; border:1px solid #333; border-radius:3px; margin:2px;" title="{color}"></div>'
+    html = _COLOR_BOX_CACHE.get((color, size))
+    return html if html is not None else _color_box_html(color, size)
+
+
+def activity_entry(record: PlacementRecord) -> PlacementRecord:
+    """Fill in the record's PDF and UI markup on first read; most logged cycles are never shown"""
+    if record.pdf_html:
+        return record
+    pdf_parts = [f"<b>Cycle {record.cycle} - {record.kind}:</b><br/>"]
+    ui_parts = []
+    
+    if record.o1_color is not None:
+        penalty_marker = " ⚠️ PENALTY" if record.o1_penalty else " ✅"
+        pdf_parts.append(f"&nbsp;&nbsp;&nbsp;&nbsp;O1: {COLOR_NAMES[record.o1_color]} → Buffer {record.o1_buffer}{penalty_marker}<br/>")
+        penalty_text = " +1s (O1 used L5-L9)" if record.o1_penalty else ""
+        ui_parts.append(f"**O1:** {render_color_box(record.o1_color, 20)} {COLOR_NAMES[record.o1_color]} → {record.o1_buffer}{penalty_text}")
+    
+    if record.o2_color is not None:
+        buffer_display = record.o2_buffer if record.o2_buffer != 'TMP_BUFFER' else 'Temp Buffer (Blocked)'
+        pdf_parts.append(f"&nbsp;&nbsp;&nbsp;&nbsp;O2: {COLOR_NAMES[record.o2_color]} → {buffer_display}<br/>")
+        buffer_display = record.o2_buffer if record.o2_buffer != 'TMP_BUFFER' else 'Temp Buffer'
+        ui_parts.append(f"**O2:** {render_color_box(record.o2_color, 20)} {COLOR_NAMES[record.o2_color]} → {buffer_display}")
+    
+    if record.tmp_color is not None:
+        ui_parts.append(f"**O2 Temp→Buffer:** {render_color_box(record.tmp_color, 20)} {COLOR_NAMES[record.tmp_color]} (ID: #{record.tmp_id}) → {record.tmp_buffer}")
+    
+    if record.conv_color is not None:
+        pdf_parts.append(f"&nbsp;&nbsp;&nbsp;&nbsp;Main Conveyor: {COLOR_NAMES[record.conv_color]} (ID #{record.conv_id}) ← from {record.conv_buffer}<br/>")
+        color_change_text = " +1s (Color Change)" if record.conv_color_change else ""
+        ui_parts.append(f"**Main Conveyor:** {render_color_box(record.conv_color, 20)} {COLOR_NAMES[record.conv_color]} (ID: #{record.conv_id}) ← from **{record.conv_buffer}**{color_change_text}")
+    
+    record.pdf_html = "".join(pdf_parts)
+    record.ui_html = "\n\n".join(ui_parts)
+    return record
+
+
+# Page styles, collapsed to one line at import since they are re-sent on every rerun
+_CUSTOM_CSS = " ".join("""
+    <style>
+    .main {background-color: #0e1117;}
+    .stButton>button {width: 100%;}
+    .buffer-row {padding: 10px; border-radius: 5px; margin: 5px 0; background-color: #1e1e1e;}
+    .jph-display {background-color: #2e7d32; padding: 10px; border-radius: 5px; color: white; font-weight: bold; text-align: center;}
+    .time-breakdown {background-color: #1e3a5f; padding: 10px; border-radius: 5px; color: white;}
+    .comparison-card {background-color: #1e1e1e; padding: 15px; border-radius: 10px; margin: 10px 0; border: 2px solid #333;}
+    .algorithm-badge {padding: 5px 10px; border-radius: 15px; color: white; font-size: 12px; font-weight: bold; display: inline-block;}
+    .graph-container {background-color: #1e1e1e; padding: 20px; border-radius: 10px; margin: 10px 0;}
+    .temp-buffer-box {
+        background: linear-gradient(135deg, #ff6b35 0%, #f7931e 100%);
+        border: 3px solid #ff8c42;
+        border-radius: 10px;
+        padding: 15px;
+        margin: 15px 0;
+        box-shadow: 0 4px 6px rgba(255, 107, 53, 0.3);
+    }
+    </style>
+""".split())
+
+
+def initial_state() -> Dict[str, object]:
+    """Fresh session state, shared by the first run and Reset"""
+    return {
+        'system': ConveyorSystem(),
+        'round_robin_system': SimpleRoundRobinConveyorSystem(),
+        'cycle': 0,
+        'running': False,
+        'next_tick': 0.0,
+        'recent_placements': deque(maxlen=RECENT_ACTIVITY_LEN),
+        'current_o1': None,
+        'current_o2': None,
+        'pending_o1_body': None,
+        'pending_o2_body': None,
+        'o2_temp_processed': deque(maxlen=RECENT_ACTIVITY_LEN),
+        'penalty_log': deque(maxlen=PENALTY_LOG_LEN),
+        'history': MetricHistory(),
+        'color_pool': ColorPool(),
+        'simulation_start_time': time.time(),
+        'simulation_start_ns': time.monotonic_ns(),
+        'buffer_overflow_count': 0,
+        'total_runtime_seconds': 0,
+    }
+
+
+def restart_comparison():
+    """Start a fresh round-robin baseline when the comparison is switched back on"""
+    if st.session_state.show_comparison:
+        st.session_state.round_robin_system = SimpleRoundRobinConveyorSystem()
+        # The earlier round-robin run is not comparable to the fresh one
+        st.session_state.history.clear_round_robin()
 
 
 def main():
     st.set_page_config(page_title="Conveyor Sequencing Simulator", layout="wide", initial_sidebar_state="expanded")
     
     # Custom CSS
-    st.markdown("""
-        <style>
-        .main {background-color: #0e1117;}
-        .stButton>button {width: 100%;}
-        .buffer-row {padding: 10px; border-radius: 5px; margin: 5px 0; background-color: #1e1e1e;}
-        .jph-display {background-color: #2e7d32; padding: 10px; border-radius: 5px; color: white; font-weight: bold; text-align: center;}
-        .time-breakdown {background-color: #1e3a5f; padding: 10px; border-radius: 5px; color: white;}
-        .comparison-card {background-color: #1e1e1e; padding: 15px; border-radius: 10px; margin: 10px 0; border: 2px solid #333;}
-        .algorithm-badge {padding: 5px 10px; border-radius: 15px; color: white; font-size: 12px; font-weight: bold; display: inline-block;}
-        .graph-container {background-color: #1e1e1e; padding: 20px; border-radius: 10px; margin: 10px 0;}
-        .temp-buffer-box {
-            background: linear-gradient(135deg, #ff6b35 0%, #f7931e 100%);
-            border: 3px solid #ff8c42;
-            border-radius: 10px;
-            padding: 15px;
-            margin: 15px 0;
-            box-shadow: 0 4px 6px rgba(255, 107, 53, 0.3);
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(_CUSTOM_CSS, unsafe_allow_html=True)
     
     st.title("Smart Conveyor Sequencing Simulator")
     st.markdown("**1s per vehicle + 1s penalties for inefficiencies**")
     
     # Initialize session state
     if 'system' not in st.session_state:
-        st.session_state.system = ConveyorSystem()
-        st.session_state.round_robin_system = SimpleRoundRobinConveyorSystem()
-        st.session_state.cycle = 0
-        st.session_state.running = False
-        st.session_state.recent_placements = []
-        st.session_state.current_o1 = None
-        st.session_state.current_o2 = None
-        st.session_state.pending_o1_body = None
-        st.session_state.pending_o2_body = None
-        st.session_state.o2_temp_processed = []
-        st.session_state.penalty_log = []
-        st.session_state.jph_history = []
-        st.session_state.penalty_history = []
-        st.session_state.color_change_history = []
-        st.session_state.simulation_start_time = datetime.datetime.now()
-        st.session_state.buffer_overflow_count = 0
-        st.session_state.total_runtime_seconds = 0
-    
-    # Update JPH for both systems
-    st.session_state.system.update_jph()
-    st.session_state.round_robin_system.update_jph()
-    
-    # Update history for graphs
-    if st.session_state.cycle > 0:
-        st.session_state.jph_history.append({
-            'cycle': st.session_state.cycle,
-            'optimized_jph': st.session_state.system.jph,
-            'round_robin_jph': st.session_state.round_robin_system.jph
-        })
-        
-        st.session_state.penalty_history.append({
-            'cycle': st.session_state.cycle,
-            'optimized_penalties': st.session_state.system.penaltyCount,
-            'round_robin_penalties': st.session_state.round_robin_system.penaltyCount
-        })
-        
-        st.session_state.color_change_history.append({
-            'cycle': st.session_state.cycle,
-            'optimized_changes': st.session_state.system.color_changeovers,
-            'round_robin_changes': st.session_state.round_robin_system.color_changeovers
-        })
+        st.session_state.update(initial_state())
     
     # Sidebar controls
     with st.sidebar:
@@ -1029,25 +1359,15 @@ def main():
         
         with col2:
             if st.button("Reset"):
-                st.session_state.system = ConveyorSystem()
-                st.session_state.round_robin_system = SimpleRoundRobinConveyorSystem()
-                st.session_state.cycle = 0
-                st.session_state.running = False
-                st.session_state.recent_placements = []
-                st.session_state.current_o1 = None
-                st.session_state.current_o2 = None
-                st.session_state.pending_o1_body = None
-                st.session_state.pending_o2_body = None
-                st.session_state.o2_temp_processed = []
-                st.session_state.penalty_log = []
-                st.session_state.jph_history = []
-                st.session_state.penalty_history = []
-                st.session_state.color_change_history = []
-                st.session_state.simulation_start_time = datetime.datetime.now()
-                st.session_state.buffer_overflow_count = 0
+                st.session_state.update(initial_state())
                 st.rerun()
         
         speed = st.select_slider("Simulation Speed", options=[0.5, 1, 2, 3], value=1, format_func=lambda x: f"{x}x")
+        cycles_per_frame = st.select_slider("Cycles per Frame", options=[1, 5, 10, 25, 50], value=10,
+                                            help="Auto-run cycles simulated between two page refreshes")
+        show_comparison = st.checkbox("Compare vs Round Robin", value=True, key="show_comparison",
+                                      on_change=restart_comparison,
+                                      help="Also simulate the round-robin baseline; re-enabling restarts it from empty buffers")
         
         st.divider()
         st.markdown("**Manual Step-by-Step Controls:**")
@@ -1083,7 +1403,7 @@ def main():
                 st.download_button(
                     label="Download PDF Report",
                     data=pdf_buffer,
-                    file_name=f"conveyor_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                    file_name=f"conveyor_report_{time.strftime('%Y%m%d_%H%M%S')}.pdf",
                     mime="application/pdf",
                     use_container_width=True
                 )
@@ -1094,25 +1414,26 @@ def main():
         
         st.divider()
         
-        st.subheader("Performance Comparison")
-        
-        # JPH Comparison
-        optimized_jph = st.session_state.system.jph
-        round_robin_jph = st.session_state.round_robin_system.jph
-        
-        col_jph1, col_jph2 = st.columns(2)
-        with col_jph1:
-            st.metric("Optimized JPH", f"{optimized_jph:.1f}")
-        with col_jph2:
-            st.metric("Round Robin JPH", f"{round_robin_jph:.1f}")
-        
-        # Performance difference
-        if optimized_jph > 0 and round_robin_jph > 0:
-            improvement = ((optimized_jph - round_robin_jph) / round_robin_jph) * 100
-            st.metric("Performance Improvement", f"{improvement:.1f}%", 
-                     delta=f"{optimized_jph - round_robin_jph:.1f} JPH")
-        
-        st.divider()
+        if show_comparison:
+            st.subheader("Performance Comparison")
+            
+            # JPH Comparison
+            optimized_jph = st.session_state.system.jph
+            round_robin_jph = st.session_state.round_robin_system.jph
+            
+            col_jph1, col_jph2 = st.columns(2)
+            with col_jph1:
+                st.metric("Optimized JPH", f"{optimized_jph:.1f}")
+            with col_jph2:
+                st.metric("Round Robin JPH", f"{round_robin_jph:.1f}")
+            
+            # Performance difference
+            if optimized_jph > 0 and round_robin_jph > 0:
+                improvement = ((optimized_jph - round_robin_jph) / round_robin_jph) * 100
+                st.metric("Performance Improvement", f"{improvement:.1f}%", 
+                         delta=f"{optimized_jph - round_robin_jph:.1f} JPH")
+            
+            st.divider()
         
         st.subheader("Optimized Algorithm Details")
         
@@ -1135,7 +1456,7 @@ def main():
         st.divider()
         st.subheader("Buffer Line Controls")
 
-        for line_id in sorted(st.session_state.system.buffer_lines.keys()):
+        for line_id in SORTED_LINE_IDS:
             buffer_line = st.session_state.system.buffer_lines[line_id]
             
             col1, col2 = st.columns([1, 1])
@@ -1147,22 +1468,22 @@ def main():
             buffer_line.is_available_input = toggle_input
             buffer_line.is_available_output = toggle_output
         
-        if st.session_state.system.main_conveyor_last_color:
+        if st.session_state.system.main_conveyor_last_color is not None:
             st.markdown("**Last Color:**")
             st.markdown(render_color_box(st.session_state.system.main_conveyor_last_color, 30) + 
-                       f" {st.session_state.system.main_conveyor_last_color}", unsafe_allow_html=True)
+                       f" {COLOR_NAMES[st.session_state.system.main_conveyor_last_color]}", unsafe_allow_html=True)
         
         st.divider()
         st.subheader("Color Legend")
-        for color in ALL_COLORS:
-            st.markdown(render_color_box(color, 20) + f" **{color}** ({COLOR_DISTRIBUTION[color]*100:.0f}%)", 
+        for color, name in enumerate(COLOR_NAMES):
+            st.markdown(render_color_box(color, 20) + f" **{name}** ({COLOR_DISTRIBUTION[name]*100:.0f}%)", 
                        unsafe_allow_html=True)
         
         # Penalty log
         if st.session_state.penalty_log:
             st.divider()
             st.subheader("Penalty Log (1s each)")
-            for log in reversed(st.session_state.penalty_log[-5:]):
+            for log in first_n(reversed(st.session_state.penalty_log), 5):
                 st.error(f"{log['time']} - {log['reason']}")
     
     # Main content - SIMULATION FIRST
@@ -1178,11 +1499,11 @@ def main():
             if st.session_state.pending_o1_body:
                 st.markdown("**Ready to place:**")
                 st.markdown(render_color_box(st.session_state.current_o1, 40) + 
-                           f" **{st.session_state.current_o1}**", unsafe_allow_html=True)
-            elif st.session_state.current_o1:
+                           f" **{COLOR_NAMES[st.session_state.current_o1]}**", unsafe_allow_html=True)
+            elif st.session_state.current_o1 is not None:
                 st.markdown("**Placed:**")
                 st.markdown(render_color_box(st.session_state.current_o1, 40) + 
-                           f" **{st.session_state.current_o1}**", unsafe_allow_html=True)
+                           f" **{COLOR_NAMES[st.session_state.current_o1]}**", unsafe_allow_html=True)
             else:
                 st.info("Waiting...")
         
@@ -1196,11 +1517,11 @@ def main():
             if st.session_state.pending_o2_body:
                 st.markdown("**Ready to place:**")
                 st.markdown(render_color_box(st.session_state.current_o2, 40) + 
-                           f" **{st.session_state.current_o2}**", unsafe_allow_html=True)
-            elif st.session_state.current_o2:
+                           f" **{COLOR_NAMES[st.session_state.current_o2]}**", unsafe_allow_html=True)
+            elif st.session_state.current_o2 is not None:
                 st.markdown("**Placed:**")
                 st.markdown(render_color_box(st.session_state.current_o2, 40) + 
-                           f" **{st.session_state.current_o2}**", unsafe_allow_html=True)
+                           f" **{COLOR_NAMES[st.session_state.current_o2]}**", unsafe_allow_html=True)
             else:
                 st.info("Waiting...")
         
@@ -1221,18 +1542,18 @@ def main():
                 st.markdown(f"**TMP**")
             with col2:
                 # Create visual boxes for temp buffer
-                boxes_html = '<div style="display: flex; align-items: center; gap: 10px; flex-wrap: wrap;">'
+                parts = [_BOX_ROW_OPEN]
+                append = parts.append
                 
                 # Filled boxes (with colors) - showing vehicles in temp buffer
                 for body in st.session_state.system.o2_temp_buffer:
-                    hex_color = COLOR_MAP.get(body.color, "#888888")
-                    boxes_html += f'<div style="width:25px; height:25px; background-color:{hex_color}; border:1px solid #ff8c42; border-radius:3px; display:inline-flex; align-items:center; justify-content:center; font-size:8px; color:#fff; font-weight:bold;" title="{body.color} (ID: {body.body_id})"></div>'
+                    hex_color = COLOR_MAP_BY_IDX[body.color]
+                    append(f'<div style="width:25px; height:25px; background-color:{hex_color}; border:1px solid #ff8c42; border-radius:3px; display:inline-flex; align-items:center; justify-content:center; font-size:8px; color:#fff; font-weight:bold;" title="{body.color_name} (ID: {body.body_id})"></div>')
                 
                 # Add count indicator
-                boxes_html += f'<div style="margin-left: 10px; font-size: 12px; color: #ff8c42; font-weight: bold;">({temp_buffer_size} waiting)</div>'
-                boxes_html += '</div>'
+                append(f'<div style="margin-left: 10px; font-size: 12px; color: #ff8c42; font-weight: bold;">({temp_buffer_size} waiting)</div></div>')
                 
-                st.markdown(boxes_html, unsafe_allow_html=True)
+                st.markdown("".join(parts), unsafe_allow_html=True)
             
             st.markdown("---")
         
@@ -1241,7 +1562,7 @@ def main():
         # Buffer lines
         st.subheader("Buffer Lines (Optimized Algorithm)")
         
-        for line_id in sorted(st.session_state.system.buffer_lines.keys()):
+        for line_id in SORTED_LINE_IDS:
             buffer = st.session_state.system.buffer_lines[line_id]
             is_o1 = line_id in O1_BUFFERS
             
@@ -1255,22 +1576,18 @@ def main():
                 st.markdown(f"**{line_id}** {badge}")
             with col2:
                 # Create visual boxes for buffer capacity
-                boxes_html = '<div style="display: flex; align-items: center; gap: 10px; flex-wrap: wrap;">'
+                parts = [_BOX_ROW_OPEN]
                 
                 # Filled boxes (with colors)
-                for body in buffer.queue:
-                    hex_color = COLOR_MAP.get(body.color, "#888888")
-                    boxes_html += f'<div style="width:25px; height:25px; background-color:{hex_color}; border:1px solid #333; border-radius:3px; display:inline-flex; align-items:center; justify-content:center; font-size:8px; color:#fff; font-weight:bold;" title="{body.color}"></div>'
+                parts.extend([_BUFFER_BOX_HTML[color] for color in buffer.get_colors().tolist()])
                 
                 # Empty boxes
-                for _ in range(capacity - filled):
-                    boxes_html += f'<div style="width:25px; height:25px; background-color:#2a2a2a; border:1px dashed #555; border-radius:3px; display:inline-flex;" title="Empty"></div>'
+                parts.append(_EMPTY_BOX_25 * (capacity - filled))
                 
                 # Add capacity indicator
-                boxes_html += f'<div style="margin-left: 10px; font-size: 12px; color: #aaa;">({filled}/{capacity})</div>'
-                boxes_html += '</div>'
+                parts.append(f'<div style="margin-left: 10px; font-size: 12px; color: #aaa;">({filled}/{capacity})</div></div>')
                 
-                st.markdown(boxes_html, unsafe_allow_html=True)
+                st.markdown("".join(parts), unsafe_allow_html=True)
             
             st.markdown("---")
     
@@ -1280,9 +1597,8 @@ def main():
         st.markdown("**Recent 10 vehicles:**")
         
         if st.session_state.system.main_conveyor_sequence:
-            recent_10 = st.session_state.system.main_conveyor_sequence[-10:]
-            for i, vehicle_data in enumerate(reversed(recent_10)):
-                vehicle_num = len(st.session_state.system.main_conveyor_sequence) - i
+            recent_10 = first_n(reversed(st.session_state.system.main_conveyor_sequence), 10)
+            for vehicle_data in recent_10:
                 color = vehicle_data['color']
                 buffer = vehicle_data['buffer']
                 vehicle_id = vehicle_data['id']
@@ -1290,7 +1606,7 @@ def main():
                 
                 penalty_indicator = " +1s" if color_change else ""
                 st.markdown(
-                    f"{render_color_box(color, 25)} **{color}** | #{vehicle_id} | from **{buffer}**{penalty_indicator}",
+                    f"{render_color_box(color, 25)} **{COLOR_NAMES[color]}** | #{vehicle_id} | from **{buffer}**{penalty_indicator}",
                     unsafe_allow_html=True
                 )
         else:
@@ -1300,96 +1616,82 @@ def main():
         
         # Recent activity
         st.subheader("Recent Activity")
-        for placement in st.session_state.recent_placements[:5]:
-            cycle_type = placement.get('type', 'Full Cycle')
-            with st.expander(f"Cycle {placement['cycle']} - {cycle_type}", expanded=False):
-                if 'o1' in placement:
-                    penalty_text = " +1s (O1 used L5-L9)" if placement['o1'].get('penalty_applied', False) else ""
-                    st.markdown(f"**O1:** {render_color_box(placement['o1']['color'], 20)} {placement['o1']['color']} → {placement['o1']['buffer']}{penalty_text}", 
-                               unsafe_allow_html=True)
-                if 'o2' in placement:
-                    buffer_display = placement['o2']['buffer'] if placement['o2']['buffer'] != 'TMP_BUFFER' else 'Temp Buffer'
-                    st.markdown(f"**O2:** {render_color_box(placement['o2']['color'], 20)} {placement['o2']['color']} → {buffer_display}", 
-                               unsafe_allow_html=True)
-                if 'o2_temp_processed' in placement:
-                    tmp = placement['o2_temp_processed']
-                    st.markdown(f"**O2 Temp→Buffer:** {render_color_box(tmp['color'], 20)} {tmp['color']} (ID: #{tmp['id']}) → {tmp['buffer']}", 
-                               unsafe_allow_html=True)
-                if 'conveyor' in placement:
-                    conv = placement['conveyor']
-                    color_change_text = " +1s (Color Change)" if conv.get('color_change', False) else ""
-                    st.markdown(f"**Main Conveyor:** {render_color_box(conv['color'], 20)} {conv['color']} (ID: #{conv['id']}) ← from **{conv['buffer']}**{color_change_text}", 
-                               unsafe_allow_html=True)
+        for activity in first_n(st.session_state.recent_placements, 5):
+            with st.expander(f"Cycle {activity.cycle} - {activity.kind}", expanded=False):
+                st.markdown(activity_entry(activity).ui_html, unsafe_allow_html=True)
 
     # ALGORITHM COMPARISON SECTION - MOVED BELOW SIMULATION
     st.markdown("---")
-    st.subheader("Algorithm Comparison")
-    
-    col_comp1, col_comp2 = st.columns(2)
-    
-    with col_comp1:
-        st.markdown('<div class="comparison-card">', unsafe_allow_html=True)
-        st.markdown('<div class="algorithm-badge" style="background-color: #2e7d32;">Optimized Algorithm</div>', unsafe_allow_html=True)
-        st.metric("Current JPH", f"{st.session_state.system.jph:.1f}")
-        st.metric("Color Changeovers", st.session_state.system.color_changeovers)
-        st.metric("O1 Violations", st.session_state.system.penaltyCount)
-        st.metric("O2 Temp Buffer", len(st.session_state.system.o2_temp_buffer))
-        st.markdown("""
-        **Strategy:**
-        - Color grouping optimization
-        - Minimize color changes
-        - Smart buffer selection
-        - Priority-based placement
-        - Temporary buffer for O2 blocking
-        """)
-        st.markdown('</div>', unsafe_allow_html=True)
+    if not show_comparison:
+        st.info("Round-robin comparison is off; enable it in the sidebar to run the baseline alongside.")
+    else:
+        st.subheader("Algorithm Comparison")
+    
+        col_comp1, col_comp2 = st.columns(2)
+    
+        with col_comp1:
+            st.markdown('<div class="comparison-card">', unsafe_allow_html=True)
+            st.markdown('<div class="algorithm-badge" style="background-color: #2e7d32;">Optimized Algorithm</div>', unsafe_allow_html=True)
+            st.metric("Current JPH", f"{st.session_state.system.jph:.1f}")
+            st.metric("Color Changeovers", st.session_state.system.color_changeovers)
+            st.metric("O1 Violations", st.session_state.system.penaltyCount)
+            st.metric("O2 Temp Buffer", len(st.session_state.system.o2_temp_buffer))
+            st.markdown("""
+            **Strategy:**
+            - Color grouping optimization
+            - Minimize color changes
+            - Smart buffer selection
+            - Priority-based placement
+            - Temporary buffer for O2 blocking
+            """)
+            st.markdown('</div>', unsafe_allow_html=True)
     
-    with col_comp2:
-        st.markdown('<div class="comparison-card">', unsafe_allow_html=True)
-        st.markdown('<div class="algorithm-badge" style="background-color: #7e57c2;">Round Robin</div>', unsafe_allow_html=True)
-        st.metric("Current JPH", f"{st.session_state.round_robin_system.jph:.1f}")
-        st.metric("Color Changeovers", st.session_state.round_robin_system.color_changeovers)
-        st.metric("O1 Violations", st.session_state.round_robin_system.penaltyCount)
-        st.markdown("""
-        **Strategy:**
-        - Simple round-robin
-        - No color consideration
-        - Sequential buffer usage
-        - Basic fairness
-        """)
-        st.markdown('</div>', unsafe_allow_html=True)
+        with col_comp2:
+            st.markdown('<div class="comparison-card">', unsafe_allow_html=True)
+            st.markdown('<div class="algorithm-badge" style="background-color: #7e57c2;">Round Robin</div>', unsafe_allow_html=True)
+            st.metric("Current JPH", f"{st.session_state.round_robin_system.jph:.1f}")
+            st.metric("Color Changeovers", st.session_state.round_robin_system.color_changeovers)
+            st.metric("O1 Violations", st.session_state.round_robin_system.penaltyCount)
+            st.markdown("""
+            **Strategy:**
+            - Simple round-robin
+            - No color consideration
+            - Sequential buffer usage
+            - Basic fairness
+            """)
+            st.markdown('</div>', unsafe_allow_html=True)
     
     # SIMPLIFIED GRAPHS SECTION - Only keeping JPH and Penalty Analysis line graphs
     if st.session_state.cycle > 0:
         st.markdown("---")
         st.subheader("Performance Analysis")
         
-        # Convert history to DataFrames
-        if st.session_state.jph_history:
-            jph_df = pd.DataFrame(st.session_state.jph_history)
-            penalty_df = pd.DataFrame(st.session_state.penalty_history)
-            
+        # Chart frames come from the history, which rebuilds them only when a cycle was recorded
+        history = st.session_state.history
+        if len(history):
             # 1. JPH Comparison Over Time
             st.markdown('<div class="graph-container">', unsafe_allow_html=True)
             st.subheader("JPH Performance Over Time")
             
             # Line chart for JPH over time
-            chart_data = pd.DataFrame({
-                'Cycle': jph_df['cycle'],
-                'Optimized Algorithm': jph_df['optimized_jph'],
-                'Round Robin': jph_df['round_robin_jph']
-            })
-            st.line_chart(chart_data.set_index('Cycle'), use_container_width=True)
+            jph_labels = {'optimized_jph': 'Optimized Algorithm'}
+            if show_comparison:
+                jph_labels['round_robin_jph'] = 'Round Robin'
+            chart_data = history.frame(jph_labels)
+            st.line_chart(chart_data, use_container_width=True)
             
             # Current JPH comparison
-            col_jph1, col_jph2, col_jph3 = st.columns(3)
-            with col_jph1:
+            if show_comparison:
+                col_jph1, col_jph2, col_jph3 = st.columns(3)
+                with col_jph1:
+                    st.metric("Optimized JPH", f"{st.session_state.system.jph:.1f}")
+                with col_jph2:
+                    st.metric("Round Robin JPH", f"{st.session_state.round_robin_system.jph:.1f}")
+                with col_jph3:
+                    improvement = ((st.session_state.system.jph - st.session_state.round_robin_system.jph) / st.session_state.round_robin_system.jph * 100) if st.session_state.round_robin_system.jph > 0 else 0
+                    st.metric("Improvement", f"{improvement:.1f}%")
+            else:
                 st.metric("Optimized JPH", f"{st.session_state.system.jph:.1f}")
-            with col_jph2:
-                st.metric("Round Robin JPH", f"{st.session_state.round_robin_system.jph:.1f}")
-            with col_jph3:
-                improvement = ((st.session_state.system.jph - st.session_state.round_robin_system.jph) / st.session_state.round_robin_system.jph * 100) if st.session_state.round_robin_system.jph > 0 else 0
-                st.metric("Improvement", f"{improvement:.1f}%")
             st.markdown('</div>', unsafe_allow_html=True)
             
             # 2. Penalty Analysis - Line Graph Only
@@ -1397,54 +1699,54 @@ def main():
             st.subheader("Penalty Analysis")
             
             # Line chart for cumulative penalties over time
-            penalty_chart_data = pd.DataFrame({
-                'Cycle': penalty_df['cycle'],
-                'Optimized Penalties': penalty_df['optimized_penalties'],
-                'Round Robin Penalties': penalty_df['round_robin_penalties']
-            })
-            st.line_chart(penalty_chart_data.set_index('Cycle'), use_container_width=True)
+            penalty_labels = {'optimized_penalties': 'Optimized Penalties'}
+            if show_comparison:
+                penalty_labels['round_robin_penalties'] = 'Round Robin Penalties'
+            penalty_chart_data = history.frame(penalty_labels)
+            st.line_chart(penalty_chart_data, use_container_width=True)
             
             # Current penalty comparison
-            col_pen1, col_pen2, col_pen3 = st.columns(3)
-            with col_pen1:
+            if show_comparison:
+                col_pen1, col_pen2, col_pen3 = st.columns(3)
+                with col_pen1:
+                    st.metric("Optimized Penalties", st.session_state.system.penaltyCount)
+                with col_pen2:
+                    st.metric("Round Robin Penalties", st.session_state.round_robin_system.penaltyCount)
+                with col_pen3:
+                    penalty_reduction = ((st.session_state.round_robin_system.penaltyCount - st.session_state.system.penaltyCount) / st.session_state.round_robin_system.penaltyCount * 100) if st.session_state.round_robin_system.penaltyCount > 0 else 100
+                    st.metric("Penalty Reduction", f"{penalty_reduction:.1f}%")
+            else:
                 st.metric("Optimized Penalties", st.session_state.system.penaltyCount)
-            with col_pen2:
-                st.metric("Round Robin Penalties", st.session_state.round_robin_system.penaltyCount)
-            with col_pen3:
-                penalty_reduction = ((st.session_state.round_robin_system.penaltyCount - st.session_state.system.penaltyCount) / st.session_state.round_robin_system.penaltyCount * 100) if st.session_state.round_robin_system.penaltyCount > 0 else 100
-                st.metric("Penalty Reduction", f"{penalty_reduction:.1f}%")
             st.markdown('</div>', unsafe_allow_html=True)
     
-    # Auto-run simulation
+    # Auto-run simulation: several cycles per rerun, since each rerun re-renders the whole page
     if st.session_state.running:
-        time.sleep(1 / speed)
-        run_single_cycle()
+        # Sleep to a deadline so render time counts toward the period; resync after pauses
+        period = 1 / speed
+        now = time.monotonic()
+        next_tick = max(st.session_state.next_tick, now - period) + period
+        st.session_state.next_tick = next_tick
+        time.sleep(max(0.0, next_tick - now))
+        for _ in range(cycles_per_frame):
+            run_single_cycle()
         st.rerun()
 
 
 def generate_oven_colors_only():
     """Only generate colors for both ovens - don't place them yet"""
     system = st.session_state.system
-    round_robin_system = st.session_state.round_robin_system
     
     # Generate colors (same for both systems for fair comparison)
-    o1_color = generate_vehicle_color()
-    o2_color = generate_vehicle_color()
+    o1_color, o2_color = st.session_state.color_pool.draw(2)
     
     st.session_state.current_o1 = o1_color
     st.session_state.current_o2 = o2_color
     
     # Create bodies but keep them pending
-    o1_body = VehicleBody(system.body_counter + 1, o1_color, OvenType.O1)
-    system.body_counter += 1
-    o2_body = VehicleBody(system.body_counter + 1, o2_color, OvenType.O2)
-    system.body_counter += 1
-    
-    # Also create bodies for round-robin system
-    rr_o1_body = VehicleBody(round_robin_system.body_counter + 1, o1_color, OvenType.O1)
-    round_robin_system.body_counter += 1
-    rr_o2_body = VehicleBody(round_robin_system.body_counter + 1, o2_color, OvenType.O2)
-    round_robin_system.body_counter += 1
+    body_id = system.body_counter
+    o1_body = VehicleBody(body_id + 1, o1_color, OvenType.O1)
+    o2_body = VehicleBody(body_id + 2, o2_color, OvenType.O2)
+    system.body_counter = body_id + 2
     
     st.session_state.pending_o1_body = o1_body
     st.session_state.pending_o2_body = o2_body
@@ -1452,10 +1754,15 @@ def generate_oven_colors_only():
 
 def place_oven_vehicles_in_buffers():
     """Place pending vehicles from ovens into buffers for both systems"""
-    system = st.session_state.system
-    round_robin_system = st.session_state.round_robin_system
-    
-    if not st.session_state.pending_o1_body and not st.session_state.pending_o2_body:
+    ss = st.session_state
+    system = ss.system
+    round_robin_system = ss.round_robin_system
+    o1_body = ss.pending_o1_body
+    o2_body = ss.pending_o2_body
+    cycle = ss.cycle
+    compare = ss.show_comparison
+    
+    if not o1_body and not o2_body:
         return  # Nothing to place
     
     # Place in optimized system
@@ -1465,260 +1772,193 @@ def place_oven_vehicles_in_buffers():
     penalty_applied_o1 = False
     
     # Place O1 vehicle in optimized system
-    if st.session_state.pending_o1_body:
-        o1_body = st.session_state.pending_o1_body
+    if o1_body:
         o1_buffer, penalty_o1, penalty_applied_o1 = system.place_for_o1(o1_body)
         
         # Also place in round-robin system
-        rr_o1_body = VehicleBody(round_robin_system.body_counter, o1_body.color, OvenType.O1)
-        round_robin_system.place_for_o1(rr_o1_body)
+        if compare:
+            round_robin_system.place_for_o1(o1_body)
         
-        st.session_state.pending_o1_body = None
+        ss.pending_o1_body = None
         
         # Log penalty if applied
         if penalty_applied_o1:
-            if 'penalty_log' not in st.session_state:
-                st.session_state.penalty_log = []
-            st.session_state.penalty_log.append({
-                'time': datetime.datetime.now().strftime("%H:%M:%S"),
+            ss.penalty_log.append({
+                'time': clock_stamp(),
                 'reason': "O1 used L5-L9 buffer"
             })
     
     # Handle O2: If temp buffer has vehicles AND O2 is unblocked, process from temp buffer
     temp_processed = None
-    if st.session_state.pending_o2_body:
-        o2_body = st.session_state.pending_o2_body
-        
-        # Check if we should process from temp buffer (optimized system only)
-        if not system.o2Stopped and system.o2_temp_buffer:
-            # Process ONE vehicle from temp buffer
-            temp_processed = system.process_o2_temp_buffer()
-            if temp_processed:
-                st.session_state.o2_temp_processed.insert(0, {
-                    'cycle': st.session_state.cycle + 1,
-                    'body': temp_processed[0],
-                    'buffer': temp_processed[1]
-                })
+    if o2_body:
+        # Process ONE vehicle from temp buffer (optimized system only; None while O2 is blocked or the buffer is empty)
+        temp_processed = system.process_o2_temp_buffer()
+        if temp_processed:
+            ss.o2_temp_processed.appendleft({
+                'cycle': cycle + 1,
+                'body': temp_processed[0],
+                'buffer': temp_processed[1]
+            })
         
         # Now handle the new O2 vehicle (will go to temp buffer if temp buffer has items or O2 is blocked)
         o2_buffer = system.place_for_o2(o2_body)
         
         # Also place in round-robin system
-        if not round_robin_system.o2Stopped:
-            rr_o2_body = VehicleBody(round_robin_system.body_counter, o2_body.color, OvenType.O2)
-            round_robin_system.place_for_o2(rr_o2_body)
+        if compare and not round_robin_system.o2Stopped:
+            round_robin_system.place_for_o2(o2_body)
         
-        st.session_state.pending_o2_body = None
+        ss.pending_o2_body = None
     
     # Record placement
-    placement_record = {
-        'cycle': st.session_state.cycle + 1,
-        'o1': {'color': st.session_state.current_o1, 'buffer': o1_buffer, 'penalty': penalty_o1, 'penalty_applied': penalty_applied_o1},
-        'o2': {'color': st.session_state.current_o2, 'buffer': o2_buffer},
-        'type': 'Placement Only'
-    }
+    tmp_body, tmp_buffer = temp_processed if temp_processed else (None, None)
+    ss.recent_placements.appendleft(PlacementRecord(
+        cycle + 1, 'Placement Only',
+        o1_color=ss.current_o1, o1_buffer=o1_buffer, o1_penalty=penalty_applied_o1,
+        o2_color=ss.current_o2, o2_buffer=o2_buffer,
+        tmp_color=tmp_body.color if tmp_body else None, tmp_buffer=tmp_buffer,
+        tmp_id=tmp_body.body_id if tmp_body else None,
+    ))
+    _finish_cycle(ss, system, round_robin_system, compare)
+
+
+def _finish_cycle(ss, system: "ConveyorSystem", round_robin_system: "SimpleRoundRobinConveyorSystem", compare: bool):
+    """Advance the cycle counter and sample the graphs; runs for every cycle of a multi-cycle auto-run frame"""
+    ss.cycle += 1
+    ss.history.append(ss.cycle, system, round_robin_system if compare else None)
+
+
+def _extract_one(system, record_details: bool = False) -> Optional[Tuple[VehicleBody, str, bool]]:
+    """Move one body from the selected buffer onto the main conveyor; returns (body, buffer_id, color_change)"""
+    selected_buffer_id = system.select_buffer_for_main_conveyor()
+    if not selected_buffer_id:
+        return None
+    body = system.get_line(selected_buffer_id).remove_body()
+    if not body:
+        return None
     
-    if temp_processed:
-        placement_record['o2_temp_processed'] = {
-            'color': temp_processed[0].color,
-            'buffer': temp_processed[1],
-            'id': temp_processed[0].body_id
-        }
+    color = body.color
+    last_color = system.main_conveyor_last_color
+    color_change = last_color is not None and last_color != color
+    # bool arithmetic keeps the counter updates off a branch
+    system.color_changeovers += color_change
+    system.total_penalty_time += color_change * PENALTY_TIME_COLOR_CHANGE
+    if color_change and record_details:
+        st.session_state.penalty_log.append({
+            'time': clock_stamp(),
+            'reason': "Color change on conveyor"
+        })
     
-    st.session_state.recent_placements.insert(0, placement_record)
-    st.session_state.cycle += 1
+    system.main_conveyor_last_color = color
+    system.total_processed += 1
+    if record_details:
+        system.main_conveyor_sequence.append({
+            'color': color,
+            'buffer': selected_buffer_id,
+            'id': body.body_id,
+            'color_change': color_change
+        })
+    return body, selected_buffer_id, color_change
 
 
 def run_single_cycle():
     """Execute one simulation cycle for both systems"""
-    system = st.session_state.system
-    round_robin_system = st.session_state.round_robin_system
+    ss = st.session_state
+    system = ss.system
+    round_robin_system = ss.round_robin_system
+    cycle = ss.cycle
+    compare = ss.show_comparison
     
     # Generate colors (same for both systems for fair comparison)
-    o1_color = generate_vehicle_color()
-    o2_color = generate_vehicle_color()
-    
-    st.session_state.current_o1 = o1_color
-    st.session_state.current_o2 = o2_color
+    o1_color, o2_color = ss.color_pool.draw(2)
     
-    # Create bodies for optimized system
-    o1_body = VehicleBody(system.body_counter + 1, o1_color, OvenType.O1)
-    system.body_counter += 1
-    o2_body = VehicleBody(system.body_counter + 1, o2_color, OvenType.O2)
-    system.body_counter += 1
+    ss.current_o1 = o1_color
+    ss.current_o2 = o2_color
     
-    # Create bodies for round-robin system
-    rr_o1_body = VehicleBody(round_robin_system.body_counter + 1, o1_color, OvenType.O1)
-    round_robin_system.body_counter += 1
-    rr_o2_body = VehicleBody(round_robin_system.body_counter + 1, o2_color, OvenType.O2)
-    round_robin_system.body_counter += 1
+    # Create bodies; the round-robin system places the same instances
+    body_id = system.body_counter
+    o1_body = VehicleBody(body_id + 1, o1_color, OvenType.O1)
+    o2_body = VehicleBody(body_id + 2, o2_color, OvenType.O2)
+    system.body_counter = body_id + 2
     
     # Place vehicles in optimized system
     o1_buffer, penalty_o1, penalty_applied_o1 = system.place_for_o1(o1_body)
     
-    # Handle O2: If temp buffer has vehicles AND O2 is unblocked, process from temp buffer
-    temp_processed = None
-    
-    # Check if we should process from temp buffer (optimized system only)
-    if not system.o2Stopped and system.o2_temp_buffer:
-        # Process ONE vehicle from temp buffer
-        temp_processed = system.process_o2_temp_buffer()
-        if temp_processed:
-            st.session_state.o2_temp_processed.insert(0, {
-                'cycle': st.session_state.cycle + 1,
-                'body': temp_processed[0],
-                'buffer': temp_processed[1]
-            })
+    # Handle O2: If temp buffer has vehicles AND O2 is unblocked, process ONE vehicle from it
+    # (optimized system only; returns None otherwise)
+    temp_processed = system.process_o2_temp_buffer()
+    if temp_processed:
+        ss.o2_temp_processed.appendleft({
+            'cycle': cycle + 1,
+            'body': temp_processed[0],
+            'buffer': temp_processed[1]
+        })
     
     # Now handle the new O2 vehicle (will go to temp buffer if temp buffer has items or O2 is blocked)
     o2_buffer = system.place_for_o2(o2_body)
     
     # Place vehicles in round-robin system
-    round_robin_system.place_for_o1(rr_o1_body)
-    if not round_robin_system.o2Stopped:
-        round_robin_system.place_for_o2(rr_o2_body)
+    if compare:
+        round_robin_system.place_for_o1(o1_body)
+        if not round_robin_system.o2Stopped:
+            round_robin_system.place_for_o2(o2_body)
     
     # Log O1 penalty if applied
     if penalty_applied_o1:
-        if 'penalty_log' not in st.session_state:
-            st.session_state.penalty_log = []
-        st.session_state.penalty_log.append({
-            'time': datetime.datetime.now().strftime("%H:%M:%S"),
+        ss.penalty_log.append({
+            'time': clock_stamp(),
             'reason': "O1 used L5-L9 buffer"
         })
     
-    # Record placement
-    placement_record = {
-        'cycle': st.session_state.cycle + 1,
-        'o1': {'color': o1_color, 'buffer': o1_buffer, 'penalty': penalty_o1, 'penalty_applied': penalty_applied_o1},
-        'o2': {'color': o2_color, 'buffer': o2_buffer}
-    }
-    
-    if temp_processed:
-        placement_record['o2_temp_processed'] = {
-            'color': temp_processed[0].color,
-            'buffer': temp_processed[1],
-            'id': temp_processed[0].body_id
-        }
-    
     # Main conveyor extraction for both systems
-    selected_buffer_id = system.select_buffer_for_main_conveyor()
+    extracted = _extract_one(system, record_details=True)
     color_change = False
-    if selected_buffer_id:
-        body = system.buffer_lines[selected_buffer_id].remove_body()
-        if body:
-            # Check for color change penalty
-            if system.main_conveyor_last_color and system.main_conveyor_last_color != body.color:
-                system.color_changeovers += 1
-                color_change = True
-                # Apply color change penalty
-                system.total_penalty_time += PENALTY_TIME_COLOR_CHANGE
-                
-                # Log penalty
-                if 'penalty_log' not in st.session_state:
-                    st.session_state.penalty_log = []
-                st.session_state.penalty_log.append({
-                    'time': datetime.datetime.now().strftime("%H:%M:%S"),
-                    'reason': "Color change on conveyor"
-                })
-            
-            system.main_conveyor_last_color = body.color
-            system.total_processed += 1
-            system.main_conveyor_sequence.append({
-                'color': body.color, 
-                'buffer': selected_buffer_id, 
-                'id': body.body_id,
-                'color_change': color_change
-            })
-            
-            # Add conveyor info to placement record
-            placement_record['conveyor'] = {
-                'color': body.color, 
-                'buffer': selected_buffer_id, 
-                'id': body.body_id,
-                'color_change': color_change
-            }
+    conv_color = conv_buffer = conv_id = None
+    if extracted:
+        body, conv_buffer, color_change = extracted
+        conv_color, conv_id = body.color, body.body_id
     
     # Also extract from round-robin system
-    rr_selected_buffer_id = round_robin_system.select_buffer_for_main_conveyor()
-    if rr_selected_buffer_id:
-        rr_body = round_robin_system.buffer_lines[rr_selected_buffer_id].remove_body()
-        if rr_body:
-            # Check for color change penalty
-            if round_robin_system.main_conveyor_last_color and round_robin_system.main_conveyor_last_color != rr_body.color:
-                round_robin_system.color_changeovers += 1
-                # Apply color change penalty
-                round_robin_system.total_penalty_time += PENALTY_TIME_COLOR_CHANGE
-            
-            round_robin_system.main_conveyor_last_color = rr_body.color
-            round_robin_system.total_processed += 1
+    if compare:
+        _extract_one(round_robin_system)
     
-    st.session_state.recent_placements.insert(0, placement_record)
-    st.session_state.cycle += 1
+    # Record placement
+    tmp_body, tmp_buffer = temp_processed if temp_processed else (None, None)
+    ss.recent_placements.appendleft(PlacementRecord(
+        cycle + 1, 'Full Cycle',
+        o1_color=o1_color, o1_buffer=o1_buffer, o1_penalty=penalty_applied_o1,
+        o2_color=o2_color, o2_buffer=o2_buffer,
+        tmp_color=tmp_body.color if tmp_body else None, tmp_buffer=tmp_buffer,
+        tmp_id=tmp_body.body_id if tmp_body else None,
+        conv_color=conv_color, conv_buffer=conv_buffer, conv_id=conv_id, conv_color_change=color_change,
+    ))
+    _finish_cycle(ss, system, round_robin_system, compare)
 
 
 def run_conveyor_cycle_only():
     """Execute only the main conveyor extraction cycle for both systems"""
-    system = st.session_state.system
-    round_robin_system = st.session_state.round_robin_system
+    ss = st.session_state
+    system = ss.system
+    round_robin_system = ss.round_robin_system
+    cycle = ss.cycle
+    compare = ss.show_comparison
     
     # Main conveyor extraction only for optimized system
-    selected_buffer_id = system.select_buffer_for_main_conveyor()
-    color_change = False
-    if selected_buffer_id:
-        body = system.buffer_lines[selected_buffer_id].remove_body()
-        if body:
-            # Check for color change penalty
-            if system.main_conveyor_last_color and system.main_conveyor_last_color != body.color:
-                system.color_changeovers += 1
-                color_change = True
-                # Apply color change penalty
-                system.total_penalty_time += PENALTY_TIME_COLOR_CHANGE
-                
-                # Log penalty
-                if 'penalty_log' not in st.session_state:
-                    st.session_state.penalty_log = []
-                st.session_state.penalty_log.append({
-                    'time': datetime.datetime.now().strftime("%H:%M:%S"),
-                    'reason': "Color change on conveyor"
-                })
-            
-            system.main_conveyor_last_color = body.color
-            system.total_processed += 1
-            system.main_conveyor_sequence.append({
-                'color': body.color, 
-                'buffer': selected_buffer_id, 
-                'id': body.body_id,
-                'color_change': color_change
-            })
-            
-            # Record conveyor extraction
-            st.session_state.recent_placements.insert(0, {
-                'cycle': st.session_state.cycle + 1,
-                'conveyor': {
-                    'color': body.color, 
-                    'buffer': selected_buffer_id, 
-                    'id': body.body_id,
-                    'color_change': color_change
-                },
-                'type': 'Conveyor Only'
-            })
+    extracted = _extract_one(system, record_details=True)
+    if extracted:
+        body, selected_buffer_id, color_change = extracted
+        
+        # Record conveyor extraction
+        ss.recent_placements.appendleft(PlacementRecord(
+            cycle + 1, 'Conveyor Only',
+            conv_color=body.color, conv_buffer=selected_buffer_id, conv_id=body.body_id,
+            conv_color_change=color_change,
+        ))
     
     # Also extract from round-robin system
-    rr_selected_buffer_id = round_robin_system.select_buffer_for_main_conveyor()
-    if rr_selected_buffer_id:
-        rr_body = round_robin_system.buffer_lines[rr_selected_buffer_id].remove_body()
-        if rr_body:
-            # Check for color change penalty
-            if round_robin_system.main_conveyor_last_color and round_robin_system.main_conveyor_last_color != rr_body.color:
-                round_robin_system.color_changeovers += 1
-                # Apply color change penalty
-                round_robin_system.total_penalty_time += PENALTY_TIME_COLOR_CHANGE
-            
-            round_robin_system.main_conveyor_last_color = rr_body.color
-            round_robin_system.total_processed += 1
+    if compare:
+        _extract_one(round_robin_system)
     
-    st.session_state.cycle += 1
+    _finish_cycle(ss, system, round_robin_system, compare)
 
 
 if __name__ == "__main__":